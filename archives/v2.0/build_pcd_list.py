@@ -13,9 +13,12 @@ Usage:
 """
 
 import pandas as pd
+import numpy as np
 import re
 import sys
 import argparse
+import json
+from functools import lru_cache
 from pathlib import Path
 from collections import Counter, defaultdict
 try:
@@ -24,6 +27,47 @@ except ImportError:
     print("ERROR: PyYAML is required. Install with: pip install pyyaml")
     sys.exit(1)
 
+# Optional multithreaded CSV parsing
+try:
+    import pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Optional multi-pattern matcher for domain filtering
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
+# Rows per chunk when filtering the domain annotation table while reading it
+DOMAIN_CHUNK_ROWS = 200_000
+
+
+def present_columns(path, usecols):
+    """Return the columns of usecols found in a TSV header, in file order"""
+    header = pd.read_csv(path, sep="\t", nrows=0).columns
+    wanted = set(usecols)
+    return [col for col in header if col in wanted]
+
+
+def read_tsv(path, usecols=None):
+    """
+    Read a TSV table from a memory-mapped file
+    
+    Uses the pyarrow parser when it is installed, the pandas C parser otherwise.
+    Memory mapping lets repeated runs read straight from the OS page cache.
+    If usecols is given, only those columns (of the ones present) are loaded.
+    """
+    if usecols is not None:
+        usecols = present_columns(path, usecols)
+    
+    if HAS_PYARROW:
+        with pyarrow.memory_map(str(path), 'r') as source:
+            return pd.read_csv(source, sep="\t", engine='pyarrow', usecols=usecols)
+    return pd.read_csv(path, sep="\t", memory_map=True, usecols=usecols)
+
 
 class GeneListBuilder:
     """Main class for building filtered gene lists"""
@@ -32,6 +76,18 @@ class GeneListBuilder:
         self.config_path = Path(config_path)
         self.config = self._load_config()
         self.output_prefix = self.config.get('output_prefix', 'gene_list')
+        
+        # ID mapping (compiled once, shared by all stages)
+        id_mapping = self.config.get('id_mapping', {})
+        self._core_re = re.compile(
+            id_mapping.get('protein_to_core_regex', r"^(BdiBd21-3\.\dG\d{7})")
+        )
+        self._suffix = id_mapping.get('seurat_suffix', '.v1.2')
+        
+        # GO selection
+        self._go_terms = frozenset(term['go_id'] for term in self.config['go_terms'])
+        self._go_level = (self.config.get('go_level_filter', 'BP') or '').upper()
+        
         self.stats = {
             'base': 0,
             'domain_filtered': 0,
@@ -39,11 +95,13 @@ class GeneListBuilder:
             'final': 0
         }
         self.reports = {}
+        self.report_counts = {}
+        self.go_annotations = None
         
     def _load_config(self):
         """Load and validate configuration"""
         with open(self.config_path, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
         return config
     
     def run(self):
@@ -103,35 +161,31 @@ class GeneListBuilder:
         # Load GO annotation
         go_file = Path(self.config['input_go_file'])
         print(f"Loading GO annotations: {go_file}")
-        go_df = pd.read_csv(go_file, sep="\t")
+        go_df = read_tsv(go_file, usecols=["gene", "GO", "level"])
+        go_df["gene"] = go_df["gene"].astype("string")
+        go_df[["GO", "level"]] = go_df[["GO", "level"]].astype("category")
         print(f"  Loaded {len(go_df):,} annotations")
         
-        # Get GO terms from config
-        go_terms = {term['go_id'] for term in self.config['go_terms']}
-        print(f"  Target GO terms: {len(go_terms)}")
+        print(f"  Target GO terms: {len(self._go_terms)}")
         
         # ID mapping
-        id_mapping = self.config.get('id_mapping', {})
-        pattern = id_mapping.get('protein_to_core_regex', r"^(BdiBd21-3\.\dG\d{7})")
-        suffix = id_mapping.get('seurat_suffix', '.v1.2')
-        
         print(f"  Mapping protein IDs to gene IDs...")
-        core_re = re.compile(pattern)
-        go_df["core"] = go_df["gene"].astype(str).str.extract(core_re, expand=False)
+        go_df["core"] = go_df["gene"].str.extract(self._core_re, expand=False)
         go_df = go_df.dropna(subset=["core"])
-        go_df["seurat_gene"] = go_df["core"] + suffix
+        go_df["seurat_gene"] = (go_df["core"] + self._suffix).astype("category")
         
         # Filter for GO terms
-        go_level = self.config.get('go_level_filter', 'BP')
-        filtered = go_df[go_df["GO"].isin(go_terms)].copy()
+        filtered = go_df[go_df["GO"].isin(self._go_terms)]
+        del go_df
         
-        if go_level and go_level.upper() != "ALL":
-            filtered = filtered[filtered["level"] == go_level.upper()]
+        if self._go_level and self._go_level != "ALL":
+            filtered = filtered[filtered["level"] == self._go_level]
         
-        genes = sorted(set(filtered["seurat_gene"].astype(str)))
+        genes = np.unique(filtered["seurat_gene"].astype(str).to_numpy()).tolist()
         
-        # Store annotation info for reports
-        self.go_annotations = filtered
+        # Keep annotation info only when requested (it can be large)
+        if self.config.get('save_go_annotations', False):
+            self.go_annotations = filtered[["seurat_gene", "GO", "level"]].copy()
         
         return genes
     
@@ -139,69 +193,77 @@ class GeneListBuilder:
         """Filter genes based on domain annotations (Step 2)"""
         domain_config = self.config['filters']['domain_filter']
         
-        # Load domain annotations
-        domain_file = Path(domain_config['annotation_file'])
-        print(f"Loading domain annotations: {domain_file}")
-        
-        try:
-            domain_df = pd.read_csv(domain_file, sep="\t")
-        except Exception as e:
-            print(f"  ERROR: Could not read domain file: {e}")
+        # Get allowed domains (without any, the filter is skipped and all genes kept)
+        allowed_domains = domain_config.get('allowed_domains', {})
+        if not allowed_domains:
+            print("  No allowed_domains configured, skipping domain filter")
             return genes
         
-        print(f"  Loaded {len(domain_df):,} domain annotations")
-        
         # Get column names
         id_col = domain_config.get('id_column', 'gene')
         domain_cols = domain_config.get('domain_columns', ['pfam', 'interpro'])
         
-        # Get allowed domains
-        allowed_domains = domain_config.get('allowed_domains', {})
+        # Load domain annotations (ID + domain columns only), mapping gene IDs
+        # and keeping rows for genes in our list chunk by chunk, so rows for
+        # other genes are never held in memory together
+        domain_file = Path(domain_config['annotation_file'])
+        print(f"Loading domain annotations: {domain_file}")
         
-        # Map gene IDs if needed
-        suffix = self.config['id_mapping']['seurat_suffix']
-        pattern = self.config['id_mapping']['protein_to_core_regex']
-        core_re = re.compile(pattern)
+        gene_set = set(genes)
+        n_rows = 0
+        chunks = []
+        try:
+            usecols = present_columns(domain_file, [id_col] + list(domain_cols))
+            reader = pd.read_csv(
+                domain_file, sep="\t", usecols=usecols, memory_map=True,
+                chunksize=DOMAIN_CHUNK_ROWS
+            )
+            for chunk in reader:
+                n_rows += len(chunk)
+                chunk["core"] = chunk[id_col].astype("string").str.extract(self._core_re, expand=False)
+                chunk = chunk.dropna(subset=["core"])
+                chunk["seurat_gene"] = chunk["core"] + self._suffix
+                chunks.append(chunk[chunk['seurat_gene'].isin(gene_set)])
+        except Exception as e:
+            print(f"  ERROR: Could not read domain file: {e}")
+            return genes
         
-        domain_df["core"] = domain_df[id_col].astype(str).str.extract(core_re, expand=False)
-        domain_df = domain_df.dropna(subset=["core"])
-        domain_df["seurat_gene"] = domain_df["core"] + suffix
+        print(f"  Loaded {n_rows:,} domain annotations")
         
-        # Filter for genes in our list
-        domain_df = domain_df[domain_df['seurat_gene'].isin(genes)]
+        if chunks:
+            domain_df = pd.concat(chunks, ignore_index=True)
+        else:
+            domain_df = pd.DataFrame(columns=usecols + ["core", "seurat_gene"])
         
-        # Find matches
+        # Find matches (report accumulated column-wise)
         matched_genes = set()
-        match_report = []
+        gene_col, type_col, domain_id_col = [], [], []
+        type_counts = Counter()
         
         for domain_type, domain_ids in allowed_domains.items():
-            if domain_type not in domain_cols:
+            if domain_type not in domain_cols or domain_type not in domain_df.columns:
                 continue
             
-            for _, row in domain_df.iterrows():
-                gene = row['seurat_gene']
-                domain_val = str(row.get(domain_type, ''))
-                
-                if pd.isna(domain_val) or domain_val == 'nan':
-                    continue
-                
-                # Check if any allowed domain is present
-                for allowed_id in domain_ids:
-                    if allowed_id in domain_val:
-                        matched_genes.add(gene)
-                        match_report.append({
-                            'gene_id': gene,
-                            'matched_domain_type': domain_type,
-                            'matched_domain_id': allowed_id
-                        })
+            hit_genes, hit_ids = self._match_domain_column(domain_df, domain_type, domain_ids)
+            gene_col.extend(hit_genes)
+            type_col.extend([domain_type] * len(hit_genes))
+            domain_id_col.extend(hit_ids)
+            matched_genes.update(hit_genes)
+            if hit_genes:
+                type_counts[domain_type] += len(hit_genes)
         
         # Save report
-        if match_report:
-            report_df = pd.DataFrame(match_report)
+        if gene_col:
+            report_df = pd.DataFrame({
+                'gene_id': gene_col,
+                'matched_domain_type': type_col,
+                'matched_domain_id': domain_id_col
+            })
             report_file = f"{self.output_prefix}_domain_filter_report.tsv"
             report_df.to_csv(report_file, sep="\t", index=False)
             print(f"  Domain filter report: {report_file}")
             self.reports['domain'] = report_df
+            self.report_counts['domain'] = type_counts
         
         filtered_genes = sorted(matched_genes)
         print(f"  Genes with matching domains: {len(filtered_genes)} / {len(genes)}")
@@ -209,6 +271,52 @@ class GeneListBuilder:
         
         return filtered_genes
     
+    def _match_domain_column(self, domain_df, domain_type, domain_ids):
+        """
+        Find allowed domain IDs occurring in one domain annotation column
+        
+        Returns two parallel lists (genes, matched allowed IDs) with one entry
+        per (annotation row, allowed ID) substring match, in file order then
+        allowed-ID order.
+        """
+        gene_col, id_col = [], []
+        if not domain_ids:
+            return gene_col, id_col
+        
+        domain_vals = domain_df[domain_type].astype(str)
+        valid = (domain_df[domain_type].notna() & (domain_vals != 'nan')).to_numpy()
+        genes = domain_df['seurat_gene'].to_numpy()
+        
+        if HAS_AHOCORASICK:
+            # One Aho-Corasick pass per cell matches every allowed ID at once
+            id_orders = defaultdict(list)
+            for id_order, allowed_id in enumerate(domain_ids):
+                id_orders[allowed_id].append(id_order)
+            automaton = ahocorasick.Automaton()
+            for allowed_id, orders in id_orders.items():
+                automaton.add_word(allowed_id, orders)
+            automaton.make_automaton()
+            
+            for gene, domain_val in zip(genes[valid], domain_vals.to_numpy()[valid]):
+                found = {o for _, orders in automaton.iter(domain_val) for o in orders}
+                for id_order in sorted(found):
+                    gene_col.append(gene)
+                    id_col.append(domain_ids[id_order])
+            
+            return gene_col, id_col
+        
+        # Fallback: one vectorized substring test per allowed ID, giving a
+        # (row x allowed ID) hit matrix that is read back in row-major order
+        hit_matrix = np.column_stack([
+            valid & domain_vals.str.contains(allowed_id, regex=False).to_numpy()
+            for allowed_id in domain_ids
+        ])
+        rows, id_orders = np.nonzero(hit_matrix)
+        gene_col = genes[rows].tolist()
+        id_col = [domain_ids[i] for i in id_orders]
+        
+        return gene_col, id_col
+    
     def _apply_orthology_filter(self, genes):
         """Filter genes based on orthology to Arabidopsis (Step 3)"""
         ortho_config = self.config['filters']['orthology_filter']
@@ -217,16 +325,22 @@ class GeneListBuilder:
         ortho_file = Path(ortho_config['orthology_file'])
         print(f"Loading orthology data: {ortho_file}")
         
+        # Read + parse (cached across builders on file identity and parse rules)
+        parse_rules = json.dumps({
+            'mapping_rules': ortho_config.get('mapping_rules', {}),
+            'one_to_one_rule': ortho_config.get('one_to_one_rule', {})
+        }, sort_keys=True)
         try:
-            ortho_df = pd.read_csv(ortho_file, sep="\t")
+            file_stat = ortho_file.stat()
+            n_pairs, ortho_data = _load_orthology(
+                str(ortho_file.resolve()), file_stat.st_mtime_ns, file_stat.st_size,
+                parse_rules, self._suffix
+            )
         except Exception as e:
             print(f"  ERROR: Could not read orthology file: {e}")
             return genes
         
-        print(f"  Loaded {len(ortho_df):,} orthology pairs")
-        
-        # Parse orthology data
-        ortho_data = self._parse_orthology_file(ortho_df, ortho_config)
+        print(f"  Loaded {n_pairs:,} orthology pairs")
         
         # Load Arabidopsis gene list if provided
         arabidopsis_genes = None
@@ -239,7 +353,16 @@ class GeneListBuilder:
         
         # Filter genes
         filtered_genes = []
-        orthology_report = []
+        orthology_report = {
+            'brachy_gene_id': [],
+            'brachy_protein_id': [],
+            'arabidopsis_hits': [],
+            'best_hit_score': [],
+            'n_hits': [],
+            'classification': [],
+            'in_reference_set': []
+        }
+        class_counts = Counter()
         
         require_arab_in_set = ortho_config.get('require_arabidopsis_in_set', False)
         prefer_one_to_one = ortho_config.get('prefer_one_to_one', False)
@@ -251,197 +374,219 @@ class GeneListBuilder:
                 arab_hits = ortho_info['arabidopsis_hits']
                 classification = ortho_info['classification']
                 
-                # Apply filters
-                keep = True
+                # Check one-to-one preference (cheap, so it goes first)
+                if prefer_one_to_one and classification != 'one_to_one':
+                    continue
                 
-                # Check if Arabidopsis orthologue is in reference set
-                if require_arab_in_set and arabidopsis_genes:
-                    if not any(hit in arabidopsis_genes for hit in arab_hits):
-                        keep = False
+                # Reference-set membership, computed once for filter and report
+                in_reference_set = (
+                    not arabidopsis_genes.isdisjoint(arab_hits) if arabidopsis_genes else None
+                )
                 
-                # Check one-to-one preference
-                if prefer_one_to_one and classification != 'one_to_one':
-                    keep = False
+                # Check if Arabidopsis orthologue is in reference set
+                if require_arab_in_set and arabidopsis_genes and not in_reference_set:
+                    continue
                 
-                if keep:
-                    filtered_genes.append(gene)
-                    orthology_report.append({
-                        'brachy_gene_id': gene,
-                        'brachy_protein_id': ortho_info['protein_id'],
-                        'arabidopsis_hits': ', '.join(arab_hits),
-                        'best_hit_score': ortho_info['best_score'],
-                        'n_hits': len(arab_hits),
-                        'classification': classification,
-                        'in_reference_set': any(hit in arabidopsis_genes for hit in arab_hits) if arabidopsis_genes else 'N/A'
-                    })
+                filtered_genes.append(gene)
+                orthology_report['brachy_gene_id'].append(gene)
+                orthology_report['brachy_protein_id'].append(ortho_info['protein_id'])
+                orthology_report['arabidopsis_hits'].append(', '.join(arab_hits))
+                orthology_report['best_hit_score'].append(ortho_info['best_score'])
+                orthology_report['n_hits'].append(len(arab_hits))
+                orthology_report['classification'].append(classification)
+                class_counts[classification] += 1
+                orthology_report['in_reference_set'].append(
+                    in_reference_set if arabidopsis_genes else 'N/A'
+                )
         
         # Save report
-        if orthology_report:
+        if filtered_genes:
             report_df = pd.DataFrame(orthology_report)
             report_file = f"{self.output_prefix}_orthology_filter_report.tsv"
             report_df.to_csv(report_file, sep="\t", index=False)
             print(f"  Orthology filter report: {report_file}")
             self.reports['orthology'] = report_df
+            self.report_counts['orthology'] = class_counts
             
             # Print classification summary
             print(f"\n  Orthology classification:")
-            for cls, count in report_df['classification'].value_counts().items():
+            for cls, count in class_counts.most_common():
                 print(f"    {cls}: {count}")
         
-        filtered_genes = sorted(filtered_genes)
+        # filtered_genes is already sorted: it preserves the order of the
+        # (sorted) input list from _extract_base_genes/_apply_domain_filter
         print(f"\n  Genes passing orthology filter: {len(filtered_genes)} / {len(genes)}")
         print(f"  Removed: {len(genes) - len(filtered_genes)}")
         
         return filtered_genes
     
-    def _parse_orthology_file(self, ortho_df, ortho_config):
+    @staticmethod
+    def _parse_orthology_file(ortho_df, ortho_config, suffix):
         """Parse inParanoid orthology file format"""
         mapping_rules = ortho_config.get('mapping_rules', {})
         brachy_regex = mapping_rules.get('brachy_id_regex_extract', r"BdiBd21-3\.\dG\d{7}")
         arab_regex = mapping_rules.get('arabidopsis_id_regex_extract', r"AT[1-5MC]G\d{5}")
         one_to_one_rule = ortho_config.get('one_to_one_rule', {})
         
-        brachy_pattern = re.compile(brachy_regex)
-        arab_pattern = re.compile(arab_regex)
-        suffix = self.config['id_mapping']['seurat_suffix']
+        brachy_pattern = re.compile(f"({brachy_regex})")
+        # One match per Arabidopsis token: the ID, the rest of that token, then
+        # the following whitespace-separated token as its score (if any)
+        hit_pattern = re.compile(rf"(?P<arab_id>{arab_regex})\S*(?:\s+(?P<score>\S+))?")
+        
+        # Parse OrtoA (Brachypodium)
+        orto_a = ortho_df['OrtoA'].astype(str)
+        brachy_core = orto_a.str.extract(brachy_pattern, expand=True)[0].dropna()
+        if brachy_core.empty:
+            return {}
+        orto_a = orto_a.loc[brachy_core.index]
+        
+        # Extract protein ID
+        first_field = orto_a.str.split().str[0].str.split(':').str[-1]
+        protein_ids = first_field.where(orto_a.str.contains(':', regex=False), brachy_core)
+        
+        # Parse OrtoB (Arabidopsis): all (ID, score) pairs, indexed by (row, match)
+        orto_b = ortho_df.loc[brachy_core.index, 'OrtoB'].astype(str)
+        pairs = orto_b.str.extractall(hit_pattern)
+        if pairs.empty:
+            return {}
+        
+        hits = pd.DataFrame({
+            'arab_id': pairs['arab_id'],
+            'score': pairs['score'].astype(float).fillna(0.0)
+        })
+        grouped = hits.groupby(level=0, sort=False).agg(list)
+        
+        # Classify relationships for all rows at once
+        scores = hits['score'].groupby(level=0, sort=False)
+        n_hits = scores.size().to_numpy()
+        best_scores = scores.max().to_numpy()
+        second_scores = (
+            hits['score'].sort_values(ascending=False, kind='stable')
+            .groupby(level=0).nth(1)
+            .droplevel(1)
+            .reindex(grouped.index)
+            .to_numpy()
+        )
+        classifications = GeneListBuilder._classify_orthology(
+            n_hits, best_scores, second_scores, one_to_one_rule
+        )
         
         ortho_data = {}
         
-        for _, row in ortho_df.iterrows():
-            # Parse OrtoA (Brachypodium)
-            orto_a = str(row['OrtoA'])
-            brachy_match = brachy_pattern.search(orto_a)
-            if not brachy_match:
-                continue
-            
-            brachy_core = brachy_match.group()
-            brachy_gene = brachy_core + suffix
-            
-            # Extract protein ID
-            protein_id = orto_a.split()[0].split(':')[-1] if ':' in orto_a else brachy_core
-            
-            # Parse OrtoB (Arabidopsis)
-            orto_b = str(row['OrtoB'])
-            arab_hits = []
-            arab_scores = []
-            
-            # Split by whitespace and extract Arabidopsis IDs and scores
-            tokens = orto_b.split()
-            for i, token in enumerate(tokens):
-                arab_match = arab_pattern.search(token)
-                if arab_match:
-                    arab_id = arab_match.group()
-                    # Next token should be score
-                    score = float(tokens[i+1]) if i+1 < len(tokens) else 0.0
-                    arab_hits.append(arab_id)
-                    arab_scores.append(score)
-            
-            if not arab_hits:
-                continue
-            
-            # Classify relationship
-            best_score = max(arab_scores)
-            n_hits = len(arab_hits)
-            
-            classification = self._classify_orthology(
-                n_hits, arab_scores, one_to_one_rule
-            )
+        for row_idx, arab_hits, arab_scores, best_score, n, classification in zip(
+            grouped.index, grouped['arab_id'], grouped['score'],
+            best_scores.tolist(), n_hits.tolist(), classifications.tolist()
+        ):
+            brachy_gene = brachy_core[row_idx] + suffix
             
             ortho_data[brachy_gene] = {
-                'protein_id': protein_id,
+                'protein_id': protein_ids[row_idx],
                 'arabidopsis_hits': arab_hits,
                 'scores': arab_scores,
                 'best_score': best_score,
-                'n_hits': n_hits,
+                'n_hits': n,
                 'classification': classification
             }
         
         return ortho_data
     
-    def _classify_orthology(self, n_hits, scores, rule):
-        """Classify orthology relationship as one-to-one, one-to-many, or low confidence"""
-        if not scores:
-            return 'low_confidence'
-        
+    @staticmethod
+    def _classify_orthology(n_hits, best_scores, second_scores, rule):
+        """
+        Classify orthology relationships as one-to-one, one-to-many, or low confidence
+        
+        Vectorized over genes: n_hits, best_scores and second_scores are
+        parallel arrays (second_scores is NaN for single-hit genes).
+        Returns an array of class labels.
+        """
         max_hits = rule.get('max_hits', 1)
         min_best_score = rule.get('min_best_score', 0.8)
         min_second_best_gap = rule.get('min_second_best_gap', 0.2)
         
-        best_score = max(scores)
-        
-        # Low confidence if best score too low
-        if best_score < min_best_score:
-            return 'low_confidence'
-        
-        # One-to-one if single hit and good score
-        if n_hits == 1:
-            return 'one_to_one'
-        
-        # Check gap to second best
-        if n_hits > 1:
-            sorted_scores = sorted(scores, reverse=True)
-            gap = sorted_scores[0] - sorted_scores[1]
-            
-            if gap >= min_second_best_gap and n_hits <= max_hits:
-                return 'one_to_one'
-        
-        return 'one_to_many'
+        with np.errstate(invalid='ignore'):
+            clear_best = (best_scores - second_scores >= min_second_best_gap) & (n_hits <= max_hits)
+        
+        return np.select(
+            [
+                best_scores < min_best_score,   # Low confidence if best score too low
+                n_hits == 1,                    # One-to-one if single hit and good score
+                (n_hits > 1) & clear_best       # Clear gap to second best
+            ],
+            ['low_confidence', 'one_to_one', 'one_to_one'],
+            default='one_to_many'
+        )
     
     def _write_output(self, genes, filename):
-        """Write gene list to file"""
-        output_file = Path(filename)
-        output_file.write_text("\n".join(genes) + "\n")
+        """Write gene list to file (streamed through a 1 MiB buffer)"""
+        with open(filename, 'w', buffering=1 << 20) as f:
+            f.writelines(f"{gene}\n" for gene in genes)
+            if not genes:
+                f.write("\n")
     
     def _write_summary(self):
         """Write filtering summary"""
         summary_file = f"{self.output_prefix}_filtering_summary.txt"
         
+        lines = []
+        lines.append("="*80 + "\n")
+        lines.append("Plant Gene Signature Builder v2.0 - Filtering Summary\n")
+        lines.append("="*80 + "\n\n")
+        
+        lines.append(f"Config file: {self.config_path}\n")
+        lines.append(f"Output prefix: {self.output_prefix}\n\n")
+        
+        lines.append("GENE COUNTS BY STAGE:\n")
+        lines.append("-" * 80 + "\n")
+        lines.append(f"  Base (GO terms):        {self.stats['base']:5d}\n")
+        
+        if self.config.get('filters', {}).get('domain_filter', {}).get('enabled', False):
+            lines.append(f"  After domain filter:    {self.stats['domain_filtered']:5d}")
+            lines.append(f"  (removed: {self.stats['base'] - self.stats['domain_filtered']})\n")
+        
+        if self.config.get('filters', {}).get('orthology_filter', {}).get('enabled', False):
+            prev_count = self.stats.get('domain_filtered', self.stats['base'])
+            lines.append(f"  After orthology filter: {self.stats['orthology_filtered']:5d}")
+            lines.append(f"  (removed: {prev_count - self.stats['orthology_filtered']})\n")
+        
+        lines.append(f"  Final:                  {self.stats['final']:5d}\n\n")
+        
+        # Domain filter details
+        if 'domain' in self.reports:
+            lines.append("DOMAIN FILTER DETAILS:\n")
+            lines.append("-" * 80 + "\n")
+            for dtype, count in self.report_counts['domain'].most_common():
+                lines.append(f"  {dtype}: {count} matches\n")
+            lines.append("\n")
+        
+        # Orthology filter details
+        if 'orthology' in self.reports:
+            lines.append("ORTHOLOGY FILTER DETAILS:\n")
+            lines.append("-" * 80 + "\n")
+            for cls, count in self.report_counts['orthology'].most_common():
+                lines.append(f"  {cls}: {count} genes\n")
+            lines.append("\n")
+        
+        summary = "".join(lines)
         with open(summary_file, 'w') as f:
-            f.write("="*80 + "\n")
-            f.write("Plant Gene Signature Builder v2.0 - Filtering Summary\n")
-            f.write("="*80 + "\n\n")
-            
-            f.write(f"Config file: {self.config_path}\n")
-            f.write(f"Output prefix: {self.output_prefix}\n\n")
-            
-            f.write("GENE COUNTS BY STAGE:\n")
-            f.write("-" * 80 + "\n")
-            f.write(f"  Base (GO terms):        {self.stats['base']:5d}\n")
-            
-            if self.config.get('filters', {}).get('domain_filter', {}).get('enabled', False):
-                f.write(f"  After domain filter:    {self.stats['domain_filtered']:5d}")
-                f.write(f"  (removed: {self.stats['base'] - self.stats['domain_filtered']})\n")
-            
-            if self.config.get('filters', {}).get('orthology_filter', {}).get('enabled', False):
-                prev_count = self.stats.get('domain_filtered', self.stats['base'])
-                f.write(f"  After orthology filter: {self.stats['orthology_filtered']:5d}")
-                f.write(f"  (removed: {prev_count - self.stats['orthology_filtered']})\n")
-            
-            f.write(f"  Final:                  {self.stats['final']:5d}\n\n")
-            
-            # Domain filter details
-            if 'domain' in self.reports:
-                f.write("DOMAIN FILTER DETAILS:\n")
-                f.write("-" * 80 + "\n")
-                domain_counts = self.reports['domain']['matched_domain_type'].value_counts()
-                for dtype, count in domain_counts.items():
-                    f.write(f"  {dtype}: {count} matches\n")
-                f.write("\n")
-            
-            # Orthology filter details
-            if 'orthology' in self.reports:
-                f.write("ORTHOLOGY FILTER DETAILS:\n")
-                f.write("-" * 80 + "\n")
-                ortho_counts = self.reports['orthology']['classification'].value_counts()
-                for cls, count in ortho_counts.items():
-                    f.write(f"  {cls}: {count} genes\n")
-                f.write("\n")
+            f.write(summary)
         
         print(f"✓ Summary saved: {summary_file}")
         
         # Print to stdout
-        with open(summary_file, 'r') as f:
-            print("\n" + f.read())
+        print("\n" + summary)
+
+
+@lru_cache(maxsize=4)
+def _load_orthology(path, mtime_ns, size, parse_rules, suffix):
+    """
+    Read and parse an orthology file, memoized on (path, mtime, size, rules)
+    
+    mtime_ns and size are only part of the cache key, so an edited file is
+    re-parsed. Returns (number of rows read, parsed ortho_data).
+    """
+    ortho_df = read_tsv(path, usecols=['OrtoA', 'OrtoB'])
+    ortho_data = GeneListBuilder._parse_orthology_file(ortho_df, json.loads(parse_rules), suffix)
+    return len(ortho_df), ortho_data
 
 
 def main():
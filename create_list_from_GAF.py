@@ -10,6 +10,7 @@ If no config file is specified, uses 'config_PCD_stress.yaml' by default.
 """
 
 import pandas as pd
+import numpy as np
 import re
 import sys
 from pathlib import Path
@@ -23,10 +24,16 @@ except ImportError:
 def load_config(config_path):
     """Load configuration from YAML file."""
     with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
     return config
 
 
+def _join_unique(values, sep, default):
+    """Join the sorted unique non-null labels of a Series, or return default."""
+    labels = sorted(set(values.dropna()))
+    return sep.join(labels) if labels else default
+
+
 def extract_genes(config):
     """Extract genes based on GO terms specified in config."""
     
@@ -51,6 +58,8 @@ def extract_genes(config):
     # ====== LOAD GO ANNOTATIONS ======
     print(f"Loading GO annotations from {GO_TSV}...")
     go = pd.read_csv(GO_TSV, sep="\t")
+    # Highly repeated string columns: categorical codes make isin/groupby cheap
+    go[["GO", "level"]] = go[["GO", "level"]].astype("category")
     print(f"  Loaded {len(go):,} annotations")
     
     # ====== MAP protein-id -> gene-id ======
@@ -67,7 +76,7 @@ def extract_genes(config):
         print(f"  Warning: {n_dropped} annotations could not be mapped")
     
     # Create Seurat-compatible gene IDs
-    go["seurat_gene"] = go["core"] + VERSION_SUFFIX
+    go["seurat_gene"] = (go["core"] + VERSION_SUFFIX).astype("category")
     print(f"  Mapped {go['seurat_gene'].nunique():,} unique genes")
     
     # ====== FILTER GO TERMS ======
@@ -82,7 +91,7 @@ def extract_genes(config):
         print(f"  Filtered to {GO_LEVEL} only: {len(pcd):,} annotations ({n_before - len(pcd)} removed)")
     
     # ====== EXTRACT UNIQUE GENES ======
-    genes = sorted(set(pcd["seurat_gene"].astype(str)))
+    genes = np.unique(pcd["seurat_gene"].astype(str).to_numpy()).tolist()
     
     # ====== CREATE GENE ANNOTATION TABLE ======
     # Build mapping dictionaries from config
@@ -90,43 +99,23 @@ def extract_genes(config):
     go_category_dict = {term['go_id']: term.get('category', 'Unclassified') for term in config['go_terms']}
     
     # Create a dataframe with gene -> GO term -> annotation mapping
-    gene_annotations = []
-    for gene in genes:
-        # Get all GO terms for this gene
-        gene_go_terms = pcd[pcd['seurat_gene'] == gene]['GO'].unique()
-        
-        # Collect categories and descriptions
-        categories = set()
-        descriptions = set()
-        go_ids = []
-        
-        for go_id in gene_go_terms:
-            go_ids.append(go_id)
-            if go_id in go_category_dict:
-                categories.add(go_category_dict[go_id])
-            if go_id in go_term_dict:
-                descriptions.add(go_term_dict[go_id])
-        
-        # Create category label
-        if categories:
-            category_label = ", ".join(sorted(categories))
-        else:
-            category_label = "Unclassified"
-        
-        # Create description label
-        if descriptions:
-            description_label = "; ".join(sorted(descriptions))
-        else:
-            description_label = "Unknown"
-        
-        gene_annotations.append({
-            'gene': gene,
-            'category': category_label,
-            'description': description_label
-        })
-    
-    # Create DataFrame
-    gene_df = pd.DataFrame(gene_annotations)
+    # (one groupby over unique gene/GO pairs instead of a scan per gene)
+    gene_go = pcd[['seurat_gene', 'GO']].drop_duplicates()
+    gene_go = gene_go.assign(
+        category=gene_go['GO'].map(go_category_dict),
+        description=gene_go['GO'].map(go_term_dict)
+    )
+    
+    gene_df = (
+        gene_go.groupby('seurat_gene', sort=True, observed=True)
+        .agg(
+            category=('category', lambda s: _join_unique(s, ", ", "Unclassified")),
+            description=('description', lambda s: _join_unique(s, "; ", "Unknown"))
+        )
+        .reindex(genes)
+        .rename_axis('gene')
+        .reset_index()
+    )
     
     # ====== WRITE OUTPUT ======
     # Write as TSV with header
@@ -137,7 +126,7 @@ def extract_genes(config):
     # Print summary by GO term
     if len(genes) > 0:
         print(f"\nGene count by GO term:")
-        go_summary = pcd.groupby('GO')['seurat_gene'].nunique().sort_values(ascending=False)
+        go_summary = pcd.groupby('GO', observed=True)['seurat_gene'].nunique().sort_values(ascending=False)
         for go_id, count in go_summary.items():
             desc = go_term_dict.get(go_id, "Unknown")
             print(f"  {go_id}: {count:4d} genes - {desc}")
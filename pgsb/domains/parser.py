@@ -1,9 +1,28 @@
 """
 Parse HMMER domtblout format
 """
+import re
 from typing import List, Dict, Set
 from collections import defaultdict
 
+import pandas as pd
+
+
+# domtblout column index -> field name (0-based, whitespace-delimited)
+DOMTBL_COLUMNS = {
+    0: 'pfam_name',        # target name: Pfam domain name (e.g., Peptidase_C14)
+    1: 'pfam_accession',   # target accession: Pfam ID (e.g., PF00656.26)
+    3: 'query_name',       # Protein ID
+    6: 'full_evalue',      # Full sequence E-value
+    7: 'full_score',       # Full sequence score
+    12: 'evalue',          # Best domain (i-)E-value
+    13: 'score',           # Best domain score
+}
+
+# Protein suffix stripped when mapping protein IDs to gene IDs (.1.p / .p)
+_PROT_SUFFIX_RE = re.compile(r'(\.1)?\.p$')
+_GENE_VERSION = '.v1.2'
+
 
 def parse_domtbl(domtbl_file: str, evalue_threshold: float = 1e-5) -> Dict[str, List[Dict]]:
     """
@@ -20,50 +39,43 @@ def parse_domtbl(domtbl_file: str, evalue_threshold: float = 1e-5) -> Dict[str,
     # Ensure evalue_threshold is float
     evalue_threshold = float(evalue_threshold)
     
-    gene_domains = defaultdict(list)
+    # Parse domtblout format (space-separated; only the fixed leading columns
+    # are read, so the free-text target description never matters)
+    # Format: target_name accession tlen query_name accession qlen full_evalue ...
+    try:
+        df = pd.read_csv(
+            domtbl_file,
+            sep=r"\s+",
+            comment='#',
+            header=None,
+            usecols=list(DOMTBL_COLUMNS),
+            dtype={0: str, 1: str, 3: str, 6: float, 7: float, 12: float, 13: float},
+            engine='c',
+            float_precision='round_trip',  # E-values exactly as written, for the <= filter
+            memory_map=True
+        )
+    except pd.errors.EmptyDataError:
+        return {}
+    df = df.rename(columns=DOMTBL_COLUMNS)
+    
+    # Lines too short to be domain hits leave NaNs in the numeric columns
+    df = df.dropna(subset=['evalue', 'score'])
+    
+    # Use domain E-value for filtering (more stringent)
+    df = df[df['evalue'] <= evalue_threshold]
+    
+    # Extract clean Pfam ID (remove version): PF00656.26 -> PF00656
+    df['pfam_id'] = df['pfam_accession'].str.split('.', n=1).str[0]
+    
+    # Extract gene ID from protein ID
+    # BdiBd21-3.2G0277200.1.p -> BdiBd21-3.2G0277200.v1.2
+    gene_ids = extract_gene_id_series(df['query_name'])
     
-    with open(domtbl_file, 'r') as f:
-        for line in f:
-            # Skip comments
-            if line.startswith('#'):
-                continue
-            
-            parts = line.strip().split()
-            if len(parts) < 23:
-                continue
-            
-            # Parse domtblout format (space-separated, some fields may have spaces)
-            # Format: target_name accession tlen query_name accession qlen full_evalue ...
-            target_name = parts[0]      # Pfam domain name (e.g., Peptidase_C14)
-            target_accession = parts[1]  # Pfam ID (e.g., PF00656.26)
-            query_name = parts[3]        # Protein ID
-            full_evalue = float(parts[6])  # Full sequence E-value
-            full_score = float(parts[7])   # Full sequence score
-            domain_evalue = float(parts[12])  # Best domain E-value
-            domain_score = float(parts[13])   # Best domain score
-            
-            # Use domain E-value for filtering (more stringent)
-            if domain_evalue > evalue_threshold:
-                continue
-            
-            # Extract clean Pfam ID (remove version)
-            pfam_id = target_accession.split('.')[0]  # PF00656
-            
-            # Extract gene ID from protein ID
-            # BdiBd21-3.2G0277200.1.p -> BdiBd21-3.2G0277200.v1.2
-            gene_id = extract_gene_id(query_name)
-            
-            domain_hit = {
-                'pfam_id': pfam_id,
-                'pfam_accession': target_accession,
-                'pfam_name': target_name,
-                'evalue': domain_evalue,
-                'score': domain_score,
-                'full_evalue': full_evalue,
-                'full_score': full_score
-            }
-            
-            gene_domains[gene_id].append(domain_hit)
+    hit_columns = ['pfam_id', 'pfam_accession', 'pfam_name', 'evalue', 'score',
+                   'full_evalue', 'full_score']
+    gene_domains = defaultdict(list)
+    for gene_id, domain_hit in zip(gene_ids, df[hit_columns].to_dict('records')):
+        gene_domains[gene_id].append(domain_hit)
     
     return dict(gene_domains)
 
@@ -77,15 +89,29 @@ def extract_gene_id(protein_id: str) -> str:
         BdiBd21-3.2G0277200.1 -> BdiBd21-3.2G0277200.v1.2
     """
     # Remove protein suffix
-    base = protein_id.replace('.1.p', '').replace('.p', '')
+    base = _PROT_SUFFIX_RE.sub('', protein_id)
     
     # Add version suffix if not present
-    if not base.endswith('.v1.2'):
-        base = f"{base}.v1.2"
+    if not base.endswith(_GENE_VERSION):
+        base = f"{base}{_GENE_VERSION}"
     
     return base
 
 
+def extract_gene_id_series(protein_ids: pd.Series) -> pd.Series:
+    """
+    Vectorized extract_gene_id for a Series of protein IDs
+    
+    Args:
+        protein_ids: Series of protein IDs (e.g., BdiBd21-3.2G0277200.1.p)
+        
+    Returns:
+        Series of gene IDs with the same index
+    """
+    base = protein_ids.str.replace(_PROT_SUFFIX_RE, '', regex=True)
+    return base.where(base.str.endswith(_GENE_VERSION), base + _GENE_VERSION)
+
+
 def filter_domains_by_list(gene_domains: Dict[str, List[Dict]], 
                            expected_domains: List[str]) -> Dict[str, List[Dict]]:
     """
@@ -1,18 +1,36 @@
 """
 Protein domain scanner using HMMER/hmmscan
 """
+import hashlib
+import json
+import mmap
 import os
+import pickle
+import shutil
 import subprocess
 import tempfile
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Set
+from typing import Callable, Iterable, List, Dict, Set, FrozenSet, Tuple
 import re
 
+# Optional in-process HMMER backend
+try:
+    import pyhmmer
+    HAS_PYHMMER = True
+except ImportError:
+    HAS_PYHMMER = False
+
 
 class DomainScanner:
     """Scan protein sequences for Pfam domains using hmmscan"""
     
-    def __init__(self, pfam_db: str, protein_fasta: str, cpu: int = 4, evalue: float = 1e-5):
+    def __init__(self, pfam_db: str, protein_fasta: str, cpu: int = 4, evalue: float = 1e-5,
+                 use_hmmsearch: bool = True, use_pyhmmer: bool = False,
+                 use_cache: bool = True, cache_dir: str = None,
+                 gene_to_protein_ids: Callable[[str], Iterable[str]] = None,
+                 n_shards: int = None):
         """
         Initialize domain scanner
         
@@ -21,11 +39,39 @@ class DomainScanner:
             protein_fasta: Path to genome protein FASTA file
             cpu: Number of CPUs for hmmscan
             evalue: E-value threshold for domain hits
+            use_hmmsearch: Search the proteins with each HMM (hmmsearch) instead
+                of each protein against the database (hmmscan); output is
+                rewritten to hmmscan's domtblout layout, and E-values use a
+                fixed search space so the same domains pass the threshold
+            use_pyhmmer: Run hmmsearch in-process with pyhmmer, keeping the
+                HMMs loaded between scans (requires pyhmmer)
+            use_cache: Reuse domain tables of earlier scans of the same proteins
+            cache_dir: Domain table cache directory
+                (default: $PGSB_CACHE_DIR/domtbl or ~/.cache/pgsb/domtbl)
+            gene_to_protein_ids: Maps a gene ID to the protein IDs it may appear
+                as in the FASTA (default: default_protein_ids, Phytozome naming)
+            n_shards: Concurrent HMMER processes the query is split over when
+                running the command line tools (default: cpu // 2)
         """
         self.pfam_db = pfam_db
         self.protein_fasta = protein_fasta
         self.cpu = cpu
         self.evalue = evalue
+        self.use_hmmsearch = use_hmmsearch
+        self._n_models = None
+        
+        if use_pyhmmer and not HAS_PYHMMER:
+            print("WARNING: pyhmmer not available, using HMMER command line tools")
+        self.use_pyhmmer = bool(use_pyhmmer) and HAS_PYHMMER
+        
+        self._index = None
+        self.gene_to_protein_ids = gene_to_protein_ids or default_protein_ids
+        self.n_shards = n_shards
+        self.use_cache = use_cache
+        if cache_dir is None:
+            cache_root = os.environ.get('PGSB_CACHE_DIR', os.path.join('~', '.cache', 'pgsb'))
+            cache_dir = os.path.join(cache_root, 'domtbl')
+        self.cache_dir = os.path.expanduser(cache_dir)
         
         # Validate files exist
         if not os.path.exists(pfam_db):
@@ -33,6 +79,10 @@ class DomainScanner:
         if not os.path.exists(protein_fasta):
             raise FileNotFoundError(f"Protein FASTA not found: {protein_fasta}")
         
+        # hmmsearch reads the flat HMM file, only hmmscan needs the index
+        if use_hmmsearch or self.use_pyhmmer:
+            return
+        
         # Check for indexed Pfam database
         required_indices = [f"{pfam_db}.h3{ext}" for ext in ['m', 'i', 'f', 'p']]
         missing = [idx for idx in required_indices if not os.path.exists(idx)]
@@ -55,54 +105,117 @@ class DomainScanner:
         """
         print(f"    Extracting proteins from {os.path.basename(self.protein_fasta)}...")
         
-        # Convert gene IDs to protein ID patterns
-        protein_patterns = set()
-        for gene_id in gene_ids:
-            # Try multiple protein ID patterns
-            base_id = gene_id.replace('.v1.2', '')
-            protein_patterns.add(f"{base_id}.1.p")  # Standard pattern
-            protein_patterns.add(f"{base_id}.1")     # Alternative
-            protein_patterns.add(gene_id)             # Exact match
-        
-        extracted = 0
-        current_seq = []
-        writing = False
-        processed_lines = 0
-        
-        with open(self.protein_fasta, 'r') as infile, open(output_fasta, 'w') as outfile:
-            for line in infile:
-                processed_lines += 1
-                if processed_lines % 100000 == 0:
-                    print(f"      Processed {processed_lines//1000}K lines, extracted {extracted} proteins...")
-                
-                if line.startswith('>'):
-                    # Save previous sequence if we were writing
-                    if writing and current_seq:
-                        outfile.write(''.join(current_seq))
-                        extracted += 1
-                    
-                    # Check if this protein matches our gene list
-                    header = line.strip()
-                    protein_id = header.split()[0][1:]  # Remove '>'
-                    
-                    # Check if any pattern matches
-                    writing = any(pattern in protein_id for pattern in protein_patterns)
-                    
-                    if writing:
-                        outfile.write(line)
-                        current_seq = []
-                else:
-                    if writing:
-                        current_seq.append(line)
-            
-            # Write last sequence
-            if writing and current_seq:
-                outfile.write(''.join(current_seq))
-                extracted += 1
+        protein_ids = self._protein_id_set(gene_ids)
+        index = self._protein_index()
+        
+        # Records matching any wanted ID, written in FASTA order
+        spans = sorted({span for protein_id in protein_ids for span in index.get(protein_id, ())})
+        
+        # Header-only records are written but not counted
+        extracted = sum(1 for _, hdr_end, seq_end in spans if seq_end > hdr_end + 1)
+        
+        # Adjacent records are copied as one block, through a 1 MB buffer
+        blocks = []
+        for hdr_start, _, seq_end in spans:
+            if blocks and blocks[-1][1] == hdr_start:
+                blocks[-1][1] = seq_end
+            else:
+                blocks.append([hdr_start, seq_end])
+        
+        with open(self.protein_fasta, 'rb') as infile, \
+                open(output_fasta, 'wb', buffering=1 << 20) as outfile:
+            if blocks:
+                with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    for block_start, block_end in blocks:
+                        outfile.write(buf[block_start:block_end])
         
         print(f"    ✓ Extracted {extracted}/{len(gene_ids)} proteins")
         return extracted
     
+    def _protein_index(self) -> Dict[bytes, List[Tuple[int, int, int]]]:
+        """
+        Index of the protein FASTA: ID -> [(header start, header end, record end)]
+        
+        Each record is listed under its protein ID (first header token) and
+        under that ID without its last dot-separated field. The index is kept
+        in {protein_fasta}.pgsbidx and rebuilt when the FASTA changes.
+        """
+        if self._index is not None:
+            return self._index
+        
+        fasta_stat = os.stat(self.protein_fasta)
+        fasta_id = (fasta_stat.st_size, fasta_stat.st_mtime_ns)
+        index_file = f"{self.protein_fasta}.pgsbidx"
+        try:
+            with open(index_file, 'rb') as f:
+                saved_id, index = pickle.load(f)
+            if saved_id == fasta_id:
+                self._index = index
+                return index
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            pass
+        
+        print(f"    Indexing {os.path.basename(self.protein_fasta)}...")
+        self._index = _index_fasta(self.protein_fasta)
+        try:
+            with open(index_file, 'wb') as f:
+                pickle.dump((fasta_id, self._index), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            print(f"    WARNING: Could not save FASTA index: {e}")
+        return self._index
+    
+    def _protein_id_set(self, gene_ids: List[str]) -> FrozenSet[bytes]:
+        """
+        Build the set of protein IDs (as bytes) the given genes may appear as
+        
+        Headers are matched by exact lookup, either of the protein ID itself or
+        of the ID with its last dot-separated field removed. Duplicate gene IDs
+        are only expanded once.
+        """
+        return frozenset(
+            protein_id.encode()
+            for gene_id in frozenset(gene_ids)
+            for protein_id in self.gene_to_protein_ids(gene_id)
+        )
+    
+    def _hmmscan_cmd(self, query_fasta: str, output_domtbl: str, cpu: int) -> List[str]:
+        """Build the hmmscan (or hmmsearch) command line for one query FASTA"""
+        if self.use_hmmsearch:
+            # -Z: compute E-values against the number of Pfam models, as hmmscan does.
+            # Domains are listed by HMMER's default --domE (10) against the same
+            # --domZ, so which domains pass the i-Evalue threshold in parse_domtbl
+            # never depends on how many proteins a model hits (the query set, the
+            # shards), which hmmsearch would otherwise use as domZ
+            n_models = self._count_models()
+            return [
+                'hmmsearch',
+                '--cpu', str(cpu),
+                '--domtblout', output_domtbl,
+                '-E', str(self.evalue),
+                *(['-Z', str(n_models), '--domZ', str(n_models)] if n_models else []),
+                self.pfam_db,
+                query_fasta
+            ]
+        return [
+            'hmmscan',
+            '--cpu', str(cpu),
+            '--domtblout', output_domtbl,
+            '-E', str(self.evalue),
+            '--domE', str(self.evalue),
+            self.pfam_db,
+            query_fasta
+        ]
+    
+    def _count_models(self) -> int:
+        """Number of HMMs in the Pfam database (counted once)"""
+        if self._n_models is None and os.path.getsize(self.pfam_db) == 0:
+            self._n_models = 0
+        if self._n_models is None:
+            with open(self.pfam_db, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                self._n_models = sum(1 for _ in re.finditer(rb'^NAME ', buf, re.MULTILINE))
+        return self._n_models
+    
     def run_hmmscan(self, query_fasta: str, output_domtbl: str) -> bool:
         """
         Run hmmscan on protein sequences
@@ -114,29 +227,175 @@ class DomainScanner:
         Returns:
             True if successful
         """
-        cmd = [
-            'hmmscan',
-            '--cpu', str(self.cpu),
-            '--domtblout', output_domtbl,
-            '-E', str(self.evalue),
-            '--domE', str(self.evalue),
-            self.pfam_db,
-            query_fasta
-        ]
+        if self.use_pyhmmer:
+            return self._run_pyhmmer(query_fasta, output_domtbl)
+        
+        cmd = self._hmmscan_cmd(query_fasta, output_domtbl, self.cpu)
+        log_file = os.path.join(os.path.dirname(os.path.abspath(output_domtbl)), 'hmmscan.log')
         
         try:
-            # Run hmmscan, suppress stdout
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=True
-            )
+            # Run hmmscan, suppress stdout and send stderr to the log
+            with open(log_file, 'wb') as log:
+                result = subprocess.run(
+                    cmd,
+                    stdout=subprocess.DEVNULL,
+                    stderr=log,
+                    check=True
+                )
+        except subprocess.CalledProcessError:
+            print(f"Error running hmmscan: {_log_tail(log_file)}")
+            return False
+        
+        if self.use_hmmsearch:
+            _hmmsearch_to_hmmscan_domtbl(output_domtbl, query_fasta)
+        return True
+    
+    def run_hmmscan_parallel(self, query_fasta: str, output_domtbl: str,
+                             n_shards: int = None) -> bool:
+        """
+        Run hmmscan as several concurrent processes over shards of the query
+        
+        hmmscan scales poorly with --cpu, so the query FASTA is split into
+        n_shards contiguous blocks of records and each block is scanned by its
+        own process with the CPUs divided between them. hmmscan reads its
+        shard on stdin straight from the mapped query; hmmsearch rewinds its
+        sequence file for every HMM, so it gets a shard file instead. Shard
+        tables are concatenated in query order, keeping comment lines of the
+        first only.
+        
+        Args:
+            query_fasta: Input protein FASTA file
+            output_domtbl: Output domain table file
+            n_shards: Number of hmmscan processes (default: self.n_shards,
+                else cpu // 2)
+            
+        Returns:
+            True if successful
+        """
+        if self.use_pyhmmer:
+            # pyhmmer already spreads the search over self.cpu threads
+            return self.run_hmmscan(query_fasta, output_domtbl)
+        
+        if n_shards is None:
+            n_shards = self.n_shards or max(1, self.cpu // 2)
+        
+        if os.path.getsize(query_fasta) == 0:
+            return self.run_hmmscan(query_fasta, output_domtbl)
+        
+        # Shards are written straight from the mapped query
+        with open(query_fasta, 'rb') as f:
+            query = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        shards = _split_fasta(query, n_shards)
+        if len(shards) <= 1:
+            query.close()
+            return self.run_hmmscan(query_fasta, output_domtbl)
+        
+        cpu_per_shard = max(1, self.cpu // len(shards))
+        shard_dir = tempfile.mkdtemp(
+            prefix='hmmscan_shards_', dir=os.path.dirname(os.path.abspath(output_domtbl))
+        )
+        procs = []
+        writers = []
+        try:
+            shard_tables = []
+            shard_logs = []
+            for i, (shard_start, shard_end) in enumerate(shards):
+                shard_domtbl = os.path.join(shard_dir, f'shard_{i}.domtbl')
+                shard_log = os.path.join(shard_dir, f'shard_{i}.log')
+                if self.use_hmmsearch:
+                    shard_fasta = os.path.join(shard_dir, f'shard_{i}.fa')
+                    with open(shard_fasta, 'wb') as f:
+                        f.write(query[shard_start:shard_end])
+                else:
+                    shard_fasta = '-'
+                with open(shard_log, 'wb') as log:
+                    proc = subprocess.Popen(
+                        self._hmmscan_cmd(shard_fasta, shard_domtbl, cpu_per_shard),
+                        stdin=subprocess.PIPE if shard_fasta == '-' else None,
+                        stdout=subprocess.DEVNULL,
+                        stderr=log
+                    )
+                procs.append(proc)
+                if shard_fasta == '-':
+                    # One feeder per shard so no process waits on another's pipe
+                    writer = threading.Thread(
+                        target=_feed_stdin, args=(proc, query, shard_start, shard_end)
+                    )
+                    writer.start()
+                    writers.append(writer)
+                shard_tables.append(shard_domtbl)
+                shard_logs.append(shard_log)
+            
+            for writer in writers:
+                writer.join()
+            success = True
+            for proc, shard_log in zip(procs, shard_logs):
+                if proc.wait() != 0:
+                    print(f"Error running hmmscan: {_log_tail(shard_log)}")
+                    success = False
+            
+            # Keep the shard logs, one after the other, next to the output
+            log_file = os.path.join(os.path.dirname(os.path.abspath(output_domtbl)), 'hmmscan.log')
+            with open(log_file, 'wb') as log:
+                for shard_log in shard_logs:
+                    with open(shard_log, 'rb') as f:
+                        shutil.copyfileobj(f, log)
+            if not success:
+                return False
+            
+            _merge_domtbls(shard_tables, output_domtbl)
+            if self.use_hmmsearch:
+                _hmmsearch_to_hmmscan_domtbl(output_domtbl, query_fasta)
             return True
-        except subprocess.CalledProcessError as e:
-            print(f"Error running hmmscan: {e.stderr}")
+        finally:
+            # On an error part-way through, stop the shards already started
+            # rather than leave them writing into a deleted shard_dir
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            for writer in writers:
+                writer.join()
+            query.close()
+            shutil.rmtree(shard_dir, ignore_errors=True)
+    
+    def _run_pyhmmer(self, query_fasta: str, output_domtbl: str) -> bool:
+        """
+        Run hmmsearch in-process with pyhmmer, writing an hmmscan-style domtbl
+        
+        Args:
+            query_fasta: Input protein FASTA file
+            output_domtbl: Output domain table file
+            
+        Returns:
+            True if successful
+        """
+        try:
+            db_stat = os.stat(self.pfam_db)
+            hmms = _load_hmms(os.path.abspath(self.pfam_db), db_stat.st_mtime_ns, db_stat.st_size)
+            if not hmms:
+                print(f"Error running pyhmmer: no HMMs in {self.pfam_db}")
+                return False
+            
+            with pyhmmer.easel.SequenceFile(query_fasta, digital=True,
+                                            alphabet=hmms[0].alphabet) as seq_file:
+                sequences = seq_file.read_block()
+            
+            # E-values against the number of Pfam models, as hmmscan does; domains
+            # are listed against the same fixed domZ (see _hmmscan_cmd)
+            with open(output_domtbl, 'wb') as out:
+                all_hits = pyhmmer.hmmer.hmmsearch(
+                    hmms, sequences, cpus=self.cpu,
+                    E=self.evalue, Z=len(hmms), domZ=len(hmms)
+                )
+                for i, hits in enumerate(all_hits):
+                    hits.write(out, format='domains', header=(i == 0))
+        except Exception as e:
+            print(f"Error running pyhmmer: {e}")
             return False
+        
+        _hmmsearch_to_hmmscan_domtbl(output_domtbl, query_fasta)
+        return True
     
     def scan_genes(self, gene_ids: List[str], output_dir: str = None) -> str:
         """
@@ -165,11 +424,231 @@ class DomainScanner:
             print(f"    WARNING: No proteins extracted for {len(gene_ids)} genes")
             return None
         
+        # Reuse an earlier scan of the same proteins if there is one
+        cache_file = None
+        if self.use_cache:
+            cache_file = os.path.join(self.cache_dir, f"{self._cache_key(protein_fasta)}.domtbl")
+            if os.path.exists(cache_file):
+                print(f"    Using cached domain table: {cache_file}")
+                shutil.copyfile(cache_file, domtbl_file)
+                return domtbl_file
+        
         # Run hmmscan
         print(f"    Running hmmscan (E-value <= {self.evalue}, {self.cpu} CPUs)...")
-        success = self.run_hmmscan(protein_fasta, domtbl_file)
+        success = self.run_hmmscan_parallel(protein_fasta, domtbl_file)
         
         if not success:
             return None
         
+        if cache_file:
+            self._store_in_cache(domtbl_file, cache_file)
+        
         return domtbl_file
+    
+    def _cache_key(self, query_fasta: str) -> str:
+        """
+        Hash a query for the domain table cache
+        
+        Covers the set of query records (each hashed separately, so the same
+        proteins in another order give the same key), the Pfam database
+        identity (path, size, mtime of the pressed .h3f if any) and the
+        search settings. The shard count is left out: hmmscan's domain search
+        space is per protein and hmmsearch runs with a fixed --domZ (recorded
+        in the key), so the rows for a protein do not depend on how the query
+        was split.
+        """
+        with open(query_fasta, 'rb') as f:
+            data = f.read()
+        record_hashes = []
+        start = 0 if data[:1] == b'>' else _next_header(data, 0)
+        while start != -1:
+            end = _next_header(data, start)
+            record = data[start:] if end == -1 else data[start:end]
+            record_hashes.append(hashlib.sha1(record.rstrip(b'\n') + b'\n').hexdigest())
+            start = end
+        
+        db_file = f"{self.pfam_db}.h3f" if os.path.exists(f"{self.pfam_db}.h3f") else self.pfam_db
+        db_stat = os.stat(db_file)
+        key = {
+            'proteins': sorted(record_hashes),
+            'pfam_db': [os.path.abspath(self.pfam_db), db_stat.st_size, db_stat.st_mtime_ns],
+            'evalue': self.evalue,
+            'program': 'hmmsearch' if self.use_hmmsearch or self.use_pyhmmer else 'hmmscan'
+        }
+        if key['program'] == 'hmmsearch':
+            key['domZ'] = self._count_models()
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _store_in_cache(self, domtbl_file: str, cache_file: str):
+        """Copy a domain table into the cache (atomic rename, failures ignored)"""
+        tmp_file = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            os.close(fd)
+            shutil.copyfile(domtbl_file, tmp_file)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"    WARNING: Could not cache domain table: {e}")
+            if tmp_file and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+def default_protein_ids(gene_id: str) -> Tuple[str, ...]:
+    """
+    Protein IDs a gene may appear as in a Phytozome proteome
+    
+    Assumes Phytozome naming: gene BdiBd21-3.2G0277200.v1.2 has primary
+    protein BdiBd21-3.2G0277200.1.p (or .1 without the suffix). Gene IDs
+    without the .v1.2 version suffix are used as the base ID as they are.
+    Other genomes can pass their own mapping to DomainScanner.
+    """
+    base_id = gene_id[:-len('.v1.2')] if gene_id.endswith('.v1.2') else gene_id
+    return (
+        f"{base_id}.1.p",  # Standard pattern
+        f"{base_id}.1",    # Alternative
+        gene_id            # Exact match
+    )
+
+
+@lru_cache(maxsize=1)
+def _load_hmms(path: str, mtime_ns: int, size: int) -> list:
+    """
+    Load all HMMs of a database, memoized on (path, mtime, size)
+    
+    Keeps the database resident across scans and DomainScanner instances;
+    mtime_ns and size are only part of the cache key.
+    """
+    with pyhmmer.plan7.HMMFile(path) as hmm_file:
+        return list(hmm_file)
+
+
+def _index_fasta(fasta: str) -> Dict[bytes, List[Tuple[int, int, int]]]:
+    """Scan a FASTA once, mapping protein IDs to record offsets"""
+    index = {}
+    with open(fasta, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return index
+        # Jump from header to header over the mapped file
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            hdr_start = 0 if buf[:1] == b'>' else _next_header(buf, 0)
+            while hdr_start != -1:
+                next_hdr = _next_header(buf, hdr_start)
+                seq_end = len(buf) if next_hdr == -1 else next_hdr
+                hdr_end = buf.find(b'\n', hdr_start, seq_end)
+                if hdr_end == -1:
+                    hdr_end = seq_end
+                
+                # Protein ID is the first header token, without '>'
+                fields = buf[hdr_start + 1:hdr_end].split(None, 1)
+                if fields:
+                    span = (hdr_start, hdr_end, seq_end)
+                    for key in {fields[0], fields[0].rsplit(b'.', 1)[0]}:
+                        index.setdefault(key, []).append(span)
+                
+                hdr_start = next_hdr
+    return index
+
+
+def _log_tail(log_file: str, n_bytes: int = 4096) -> str:
+    """Last n_bytes of a log file, decoded for error messages"""
+    with open(log_file, 'rb') as f:
+        f.seek(max(0, os.fstat(f.fileno()).st_size - n_bytes))
+        return f.read().decode('utf-8', errors='replace')
+
+
+def _next_header(buf, pos: int) -> int:
+    """Offset of the first FASTA header line starting after pos, or -1"""
+    found = buf.find(b'\n>', pos)
+    return -1 if found == -1 else found + 1
+
+
+_NON_SPACE = re.compile(rb'\S')
+
+
+def _split_fasta(data, n_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split FASTA data into up to n_shards contiguous blocks of whole records
+    
+    Blocks are cut at the header nearest each 1/n_shards of the data, so they
+    hold similar amounts of sequence. Returns (start, end) offsets; empty
+    blocks are dropped.
+    """
+    starts = [0]
+    for i in range(1, n_shards):
+        cut = _next_header(data, max(starts[-1], len(data) * i // n_shards - 1))
+        if cut == -1:
+            break
+        if cut > starts[-1]:
+            starts.append(cut)
+    bounds = starts + [len(data)]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if _NON_SPACE.search(data, a, b)]
+
+
+def _feed_stdin(proc: subprocess.Popen, data, start: int, end: int):
+    """Write data[start:end] to a process's stdin and close it"""
+    try:
+        with memoryview(data) as view:
+            proc.stdin.write(view[start:end])
+    except BrokenPipeError:
+        # The process exited early; its return code reports the failure
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def _merge_domtbls(shard_tables: List[str], output_domtbl: str):
+    """Concatenate domtblout shards, keeping the comment lines of the first"""
+    with open(output_domtbl, 'w') as out:
+        for i, shard_table in enumerate(shard_tables):
+            with open(shard_table, 'r') as f:
+                lines = f.readlines()
+            if i == 0:
+                # Leading comments (column header) go first, trailing ones last
+                n_head = next((j for j, line in enumerate(lines) if not line.startswith('#')), len(lines))
+                out.writelines(lines[:n_head])
+                footer = [line for line in lines[n_head:] if line.startswith('#')]
+                lines = lines[n_head:]
+            out.writelines(line for line in lines if not line.startswith('#'))
+        out.writelines(footer)
+
+
+def _hmmsearch_to_hmmscan_domtbl(domtbl: str, query_fasta: str):
+    """
+    Rewrite an hmmsearch domtblout in place into hmmscan's layout
+    
+    Swaps the target (sequence) and query (HMM) name/accession/length columns,
+    and orders hits by query protein in FASTA order, then by full-sequence
+    E-value, as hmmscan reports them. Comment lines are kept as they are.
+    """
+    query_order = {}
+    with open(query_fasta, 'r') as f:
+        for line in f:
+            if line.startswith('>'):
+                fields = line[1:].split(None, 1)
+                if fields:
+                    query_order.setdefault(fields[0], len(query_order))
+    
+    with open(domtbl, 'r') as f:
+        lines = f.readlines()
+    n_head = next((i for i, line in enumerate(lines) if not line.startswith('#')), len(lines))
+    header = lines[:n_head]
+    footer = [line for line in lines[n_head:] if line.startswith('#')]
+    
+    rows = []
+    for line in lines[n_head:]:
+        if line.startswith('#') or not line.strip():
+            continue
+        # 22 fixed columns, then the free-text description
+        fields = line.rstrip('\n').split(None, 22)
+        fields[0:3], fields[3:6] = fields[3:6], fields[0:3]
+        rows.append((query_order.get(fields[3], len(query_order)), float(fields[6]), fields))
+    rows.sort(key=lambda row: row[:2])
+    
+    with open(domtbl, 'w') as f:
+        f.writelines(header)
+        f.writelines(' '.join(fields) + '\n' for _, _, fields in rows)
+        f.writelines(footer)
@@ -15,10 +15,22 @@ import sys
 import hashlib
 import json
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import yaml
 
+# Run ID timestamp (YYYY-MM-DD_HHMMSS)
+RUN_TIMESTAMP_FORMAT = "%Y-%m-%d_%H%M%S"
+
+# libyaml-backed dumper when available
+_YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+# Same output as json.dumps(..., sort_keys=True)
+_CONFIG_ENCODER = json.JSONEncoder(sort_keys=True)
+
 
 def compute_config_hash(config_dict):
     """
@@ -30,9 +42,11 @@ def compute_config_hash(config_dict):
     Returns:
         str: First 8 characters of SHA1 hash
     """
-    # Serialize config deterministically
-    config_str = json.dumps(config_dict, sort_keys=True)
-    hash_obj = hashlib.sha1(config_str.encode('utf-8'))
+    # Serialize config deterministically, hashing the JSON chunks as they are
+    # produced instead of building the whole string first
+    hash_obj = hashlib.sha1()
+    for chunk in _CONFIG_ENCODER.iterencode(config_dict):
+        hash_obj.update(chunk.encode('utf-8'))
     return hash_obj.hexdigest()[:8]
 
 
@@ -57,7 +71,7 @@ def create_run_dir(config_dict, output_prefix, run_name=None, overwrite=False, b
         }
     """
     # Generate run identifier
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+    timestamp = time.strftime(RUN_TIMESTAMP_FORMAT, time.localtime())
     config_hash = compute_config_hash(config_dict)
     
     # Build run_id: timestamp__prefix__hash[__custom]
@@ -108,7 +122,7 @@ def write_config_snapshot(config_dict, run_dir):
     """
     config_path = Path(run_dir) / "config_used.yaml"
     with open(config_path, 'w') as f:
-        yaml.dump(config_dict, f, default_flow_style=False, sort_keys=False)
+        yaml.dump(config_dict, f, Dumper=_YAML_DUMPER, default_flow_style=False, sort_keys=False)
     return config_path
 
 
@@ -126,20 +140,28 @@ def update_latest_symlink(run_dir, base_dir="results"):
     latest_link = base_path / "latest"
     run_path = Path(run_dir)
     
-    # Remove existing symlink/file
-    if latest_link.exists() or latest_link.is_symlink():
-        latest_link.unlink()
-    
-    # Try to create symlink (Unix/Mac)
+    # Try to create symlink (Unix/Mac): build it under a temporary name and
+    # rename it over the old one, so 'latest' never goes missing
+    tmp_link = base_path / f".latest.{os.getpid()}"
     try:
         # Use relative path for portability
         relative_path = os.path.relpath(run_path, base_path)
-        latest_link.symlink_to(relative_path)
+        if tmp_link.is_symlink():
+            tmp_link.unlink()
+        tmp_link.symlink_to(relative_path)
+        os.replace(tmp_link, latest_link)
     except (OSError, NotImplementedError):
-        # Windows fallback: write text file
+        if tmp_link.is_symlink():
+            tmp_link.unlink()
+        # An old link would shadow the text file in get_latest_run_dir
+        if latest_link.is_symlink():
+            latest_link.unlink()
+        # Windows fallback: write text file, replaced atomically as well
         latest_txt = base_path / "latest_path.txt"
-        with open(latest_txt, 'w') as f:
+        tmp_txt = base_path / "latest_path.txt.tmp"
+        with open(tmp_txt, 'w') as f:
             f.write(str(run_path.absolute()) + "\n")
+        os.replace(tmp_txt, latest_txt)
 
 
 def create_manifest(files_info, run_dir):
@@ -163,18 +185,18 @@ def create_manifest(files_info, run_dir):
         'files': []
     }
     
-    for file_info in files_info:
+    # Hash existing files concurrently (hashlib releases the GIL), keeping
+    # the input order in the manifest
+    files_info = [f for f in files_info if (run_path / f['path']).exists()]
+    max_workers = max(1, min(8, os.cpu_count() or 1, len(files_info)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        checksums = list(executor.map(
+            lambda f: _sha256_file(run_path / f['path']), files_info
+        ))
+    
+    for file_info, sha256_hash in zip(files_info, checksums):
         file_path = run_path / file_info['path']
         
-        if not file_path.exists():
-            continue
-        
-        # Compute checksum
-        sha256_hash = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(chunk)
-        
         manifest['files'].append({
             'path': file_info['path'],
             'description': file_info.get('description', ''),
@@ -190,6 +212,25 @@ def create_manifest(files_info, run_dir):
     return manifest_path
 
 
+def _sha256_file(file_path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file, read in 1 MB chunks
+    
+    Uses hashlib.file_digest (Python 3.11+) when available, otherwise reads
+    into one reused buffer.
+    """
+    with open(file_path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256')
+        
+        sha256_hash = hashlib.sha256()
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        while n := f.readinto(buf):
+            sha256_hash.update(view[:n])
+        return sha256_hash
+
+
 def get_latest_run_dir(base_dir="results"):
     """
     Get path to latest run directory
@@ -217,8 +258,11 @@ def get_latest_run_dir(base_dir="results"):
     # Fallback: find most recent by name
     runs_dir = base_path / "runs"
     if runs_dir.exists():
-        run_dirs = sorted([d for d in runs_dir.iterdir() if d.is_dir()], reverse=True)
-        if run_dirs:
-            return run_dirs[0]
+        # Directory entries carry their type, so no stat per run; run names
+        # start with the timestamp, so the largest name is the newest run
+        with os.scandir(runs_dir) as entries:
+            run_names = [e.name for e in entries if e.is_dir()]
+        if run_names:
+            return runs_dir / max(run_names)
     
     return None
@@ -21,10 +21,16 @@ import numpy as np
 import re
 import sys
 import argparse
+import csv
 import hashlib
+import importlib.util
 import json
+import mmap
+import os
+import pickle
 from pathlib import Path
 from collections import Counter, defaultdict
+from urllib.parse import unquote
 try:
     import yaml
 except ImportError:
@@ -41,15 +47,79 @@ except ImportError:
     print("ERROR: pgsb package not found. Make sure pgsb/ is in PYTHONPATH or current directory.")
     sys.exit(1)
 
-# Optional plotting
+# Optional plotting, imported only when QC plots are drawn
+HAS_PLOTTING = importlib.util.find_spec('matplotlib') is not None
+
+# Optional multithreaded CSV parsing
 try:
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    HAS_PLOTTING = True
+    import pyarrow
+    HAS_PYARROW = True
 except ImportError:
-    HAS_PLOTTING = False
+    HAS_PYARROW = False
+
+# Optional multi-pattern matcher for keyword scoring
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
+# Bump when a cached parser's output changes, to invalidate old cache entries
+_INPUT_CACHE_VERSION = 1
+
+# Araport GFF3 parsing: seqid and attributes column of each gene feature line
+_GFF_GENE_LINE = re.compile(rb'^([^\t\n]*)\t[^\t\n]*\tgene\t(?:[^\t\n]*\t){5}([^\t\n]*)', re.MULTILINE)
+_AT_LOCUS = re.compile(rb'(AT[1-5MC]G\d{5})')
+_GFF_ATTRIBUTES = [
+    re.compile(rb'symbol=([^;]+)'),
+    re.compile(rb'curator_summary=([^;]+)'),
+    re.compile(rb'full_name=([^;]+)'),
+    re.compile(rb'computational_description=([^;]+)'),
+    re.compile(rb'Note=([^;]+)'),
+]
+
+
+def read_tsv(path):
+    """
+    Read a TSV table
+    
+    Uses the multithreaded pyarrow parser when it is installed, the pandas C
+    parser otherwise or when pyarrow rejects the file (e.g. rows with missing
+    trailing fields, which the C parser pads with NaN).
+    """
+    if HAS_PYARROW:
+        try:
+            return pd.read_csv(path, sep="\t", engine='pyarrow')
+        except pd.errors.ParserError:
+            pass
+    return pd.read_csv(path, sep="\t")
+
+
+def write_tsv(df, path):
+    """
+    Write a table as TSV, the way DataFrame.to_csv(sep="\t", index=False) does
+    
+    Rows are streamed from the columns through csv.writer, skipping pandas'
+    per-cell formatting; missing values are written as empty fields.
+    """
+    columns = [df[name].to_numpy(dtype=object, na_value=None) for name in df.columns]
+    
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(df.columns)
+        writer.writerows(zip(*columns))
+
+
+def write_lines(path, lines):
+    """
+    Write one item per line, streamed through a 1 MiB buffer
+    
+    An empty list gives a file holding a single newline.
+    """
+    with open(path, 'w', buffering=1 << 20) as f:
+        f.writelines(f"{line}\n" for line in lines)
+        if not lines:
+            f.write("\n")
 
 
 class GeneSignatureRanker:
@@ -68,19 +138,27 @@ class GeneSignatureRanker:
             overwrite=overwrite
         )
         
-        # Gene data structures
-        self.gene_scores_raw = {}
-        self.gene_scores_capped = {}
+        # Gene data structures (scores: genes x evidence layer tables)
+        self.gene_scores_raw = pd.DataFrame()
+        self.gene_scores_capped = pd.DataFrame()
         self.gene_evidence = {}
+        self.gene_categories = {}  # GO category label per gene, e.g. 'PCD-ROS'
         self.synergy_bonuses = {}
         
         # Annotation caches
         self.arabidopsis_annotations = {}
         self.arabidopsis_po_context = {}
         
+        # The same caches as tables indexed by AT locus, for bulk ortholog lookups
+        self.arabidopsis_annotation_table = self._annotation_table({}, ['symbol', 'annotation_text'])
+        self.arabidopsis_po_table = self._annotation_table({}, ['po_terms', 'hits'])
+        
+        # GFF3 annotation of each gene's best ortholog (set by orthology scoring)
+        self.best_ortholog_annotations = self.arabidopsis_annotation_table.iloc[:0]
+        
     def _load_config(self):
         with open(self.config_path, 'r') as f:
-            return yaml.safe_load(f)
+            return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
     
     def run(self, enable_qc=False):
         """Execute scoring pipeline"""
@@ -112,15 +190,13 @@ class GeneSignatureRanker:
         print(f"✓ Base genes: {len(base_genes)}\n")
         
         # Initialize scoring
+        self.gene_scores_raw = pd.DataFrame(
+            0, index=base_genes, columns=['go', 'domain', 'orthology', 'tair', 'po', 'synergy']
+        )
+        self.gene_scores_capped = pd.DataFrame(
+            0, index=base_genes, columns=['go', 'domain', 'orthology', 'tair', 'po', 'synergy', 'total']
+        )
         for gene in base_genes:
-            self.gene_scores_raw[gene] = {
-                'go': 0, 'domain': 0, 'orthology': 0,
-                'tair': 0, 'po': 0, 'synergy': 0
-            }
-            self.gene_scores_capped[gene] = {
-                'go': 0, 'domain': 0, 'orthology': 0,
-                'tair': 0, 'po': 0, 'synergy': 0, 'total': 0
-            }
             self.gene_evidence[gene] = {
                 'go_terms': [], 'go_categories': [],
                 'matched_domains': [],
@@ -199,8 +275,6 @@ class GeneSignatureRanker:
         """Extract base gene list from GO terms"""
         go_file = Path(self.config['input_go_file'])
         print(f"Loading: {go_file.name}")
-        go_df = pd.read_csv(go_file, sep="\t")
-        print(f"  {len(go_df):,} annotations")
         
         # Collect all GO terms
         go_terms = set()
@@ -210,8 +284,30 @@ class GeneSignatureRanker:
             if isinstance(terms, dict):
                 go_terms.update(terms.keys())
         
+        go_level = self.config.get('go_level_filter', 'BP')
+        n_annotations, filtered = self._cached(
+            'go', [go_file],
+            {'go_terms': sorted(go_terms), 'id_mapping': self.config['id_mapping'], 'go_level': go_level},
+            lambda: self._load_go_annotations(go_file, go_terms, go_level)
+        )
+        print(f"  {n_annotations:,} annotations")
         print(f"  Target GO terms: {len(go_terms)}")
         
+        self.go_annotations = filtered
+        genes = np.unique(filtered["seurat_gene"].to_numpy()).tolist()
+        return genes
+    
+    def _load_go_annotations(self, go_file, go_terms, go_level):
+        """
+        Read the GO annotation file and keep rows for the target terms
+        
+        Returns:
+            (number of annotations in the file, filtered DataFrame with a
+            seurat_gene column)
+        """
+        go_df = read_tsv(go_file)
+        n_annotations = len(go_df)
+        
         # ID mapping
         pattern = self.config['id_mapping']['protein_to_core_regex']
         suffix = self.config['id_mapping']['seurat_suffix']
@@ -222,14 +318,75 @@ class GeneSignatureRanker:
         go_df["seurat_gene"] = go_df["core"] + suffix
         
         # Filter
-        go_level = self.config.get('go_level_filter', 'BP')
         filtered = go_df[go_df["GO"].isin(go_terms)].copy()
         if go_level and go_level.upper() != "ALL":
             filtered = filtered[filtered["level"] == go_level.upper()]
         
-        self.go_annotations = filtered
-        genes = sorted(set(filtered["seurat_gene"]))
-        return genes
+        return n_annotations, filtered
+    
+    def _cached(self, step, input_files, params, compute):
+        """
+        Run an input parsing step, memoized on disk across runs
+        
+        The cache key covers the step, each input file's path, size and mtime
+        and the config values the result depends on, so editing either one
+        recomputes it. None results (failed reads) are not cached. Disabled
+        with `cache: {enabled: false}`.
+        
+        Args:
+            step: Step name (prefix of the cache file)
+            input_files: Files the step reads
+            params: JSON-serializable config values the result depends on
+            compute: Callable producing the result
+            
+        Returns:
+            Cached or freshly computed result
+        """
+        cache_config = self.config.get('cache') or {}
+        if not cache_config.get('enabled', True) or not all(Path(f).exists() for f in input_files):
+            return compute()
+        
+        inputs = []
+        for input_file in input_files:
+            stat = Path(input_file).stat()
+            inputs.append([str(Path(input_file).resolve()), stat.st_size, stat.st_mtime_ns])
+        key_data = json.dumps(
+            {'version': _INPUT_CACHE_VERSION, 'step': step, 'inputs': inputs, 'params': params},
+            sort_keys=True, default=str
+        )
+        key = hashlib.sha256(key_data.encode()).hexdigest()[:16]
+        
+        cache_root = os.environ.get('PGSB_CACHE_DIR', os.path.join('~', '.cache', 'pgsb'))
+        cache_dir = Path(os.path.expanduser(cache_config.get('dir') or os.path.join(cache_root, 'inputs')))
+        cache_file = cache_dir / f"{step}_{key}.pkl"
+        
+        if cache_file.exists():
+            try:
+                with open(cache_file, 'rb') as f:
+                    return pickle.load(f)
+            except Exception as e:
+                print(f"  WARNING: Ignoring unreadable cache file {cache_file.name}: {e}")
+        
+        result = compute()
+        if result is None:
+            # A failed read: retried on the next run rather than replayed
+            return result
+        
+        # Write under a temporary name so concurrent runs never read a partial file
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}")
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"  WARNING: Could not write cache file {cache_file}: {e}")
+        return result
+    
+    def _set_layer_scores(self, layer, raw_scores, cap):
+        """Store one evidence layer's raw scores (in gene order) and the capped values"""
+        self.gene_scores_raw[layer] = raw_scores
+        self.gene_scores_capped[layer] = np.minimum(self.gene_scores_raw[layer], cap)
     
     def _score_go_evidence(self, genes):
         """Score GO evidence with cap"""
@@ -237,35 +394,47 @@ class GeneSignatureRanker:
         caps = scoring['caps']
         weights = scoring['weights']['go']
         
+        # Long-form (GO, category, weight) table, one row per weighted term
+        weights_df = pd.DataFrame(
+            [(go_id, category, weight)
+             for category, term_weights in weights.items() if isinstance(term_weights, dict)
+             for go_id, weight in term_weights.items()],
+            columns=['GO', 'category', 'weight']
+        )
+        weights_df['category_order'] = np.arange(len(weights_df))
+        
+        # One row per (annotation, matching category), in annotation order and
+        # then config category order, so first appearances match a row scan
+        annots = self.go_annotations[['seurat_gene', 'GO']].reset_index(drop=True)
+        annots['row_order'] = np.arange(len(annots))
+        merged = annots.merge(weights_df, on='GO').sort_values(
+            ['row_order', 'category_order'], kind='stable'
+        )
+        by_gene = merged.groupby('seurat_gene', sort=False)
+        raw = by_gene['weight'].sum().reindex(genes, fill_value=0)
+        terms = by_gene['GO'].unique()
+        # Interned so the few category names are shared across all genes
+        categories = by_gene['category'].unique().map(lambda cats: [sys.intern(c) for c in cats])
+        
+        self._set_layer_scores('go', raw.tolist(), caps['go_max'])
+        
+        # Categorize genes in the same pass: matched categories joined with
+        # '-' in sorted order, or 'unknown'
         for gene in genes:
-            annots = self.go_annotations[self.go_annotations['seurat_gene'] == gene]
-            
-            raw_score = 0
-            go_terms = []
-            categories = []
-            
-            for _, row in annots.iterrows():
-                go_id = row['GO']
-                # Check each category
-                for category, term_weights in weights.items():
-                    if isinstance(term_weights, dict) and go_id in term_weights:
-                        raw_score += term_weights[go_id]
-                        go_terms.append(go_id)
-                        if category not in categories:
-                            categories.append(category)
-            
-            capped_score = min(raw_score, caps['go_max'])
-            
-            self.gene_scores_raw[gene]['go'] = raw_score
-            self.gene_scores_capped[gene]['go'] = capped_score
-            self.gene_evidence[gene]['go_terms'] = sorted(set(go_terms))
-            self.gene_evidence[gene]['go_categories'] = categories
-        
-        raw_scores = [self.gene_scores_raw[g]['go'] for g in genes]
-        capped_scores = [self.gene_scores_capped[g]['go'] for g in genes]
-        print(f"  Raw: min={min(raw_scores):.1f}, max={max(raw_scores):.1f}, mean={np.mean(raw_scores):.1f}")
+            if gene in terms.index:
+                self.gene_evidence[gene]['go_terms'] = sorted(terms[gene])
+                self.gene_evidence[gene]['go_categories'] = categories[gene]
+                self.gene_categories[gene] = sys.intern('-'.join(sorted(categories[gene])) or 'unknown')
+            else:
+                self.gene_evidence[gene]['go_terms'] = []
+                self.gene_evidence[gene]['go_categories'] = []
+                self.gene_categories[gene] = 'unknown'
+        
+        raw_scores = self.gene_scores_raw['go']
+        capped_scores = self.gene_scores_capped['go']
+        print(f"  Raw: min={raw_scores.min():.1f}, max={raw_scores.max():.1f}, mean={np.mean(raw_scores):.1f}")
         print(f"  Capped (max={caps['go_max']}): mean={np.mean(capped_scores):.1f}")
-        print(f"  {sum(1 for s in raw_scores if s > caps['go_max'])} genes hit cap")
+        print(f"  {(raw_scores > caps['go_max']).sum()} genes hit cap")
     
     def _load_arabidopsis_annotations(self):
         """Load Arabidopsis GFF3 and PO annotations"""
@@ -276,7 +445,9 @@ class GeneSignatureRanker:
             gff_path = Path(gff_file)
             if gff_path.exists():
                 print(f"Loading GFF3: {gff_path.name}")
-                self.arabidopsis_annotations = self._parse_araport_gff3(gff_path)
+                self.arabidopsis_annotations = self._cached(
+                    'gff3', [gff_path], {}, lambda: self._parse_araport_gff3(gff_path)
+                )
                 print(f"  {len(self.arabidopsis_annotations)} genes")
             else:
                 print(f"  WARNING: GFF3 file not found: {gff_file}")
@@ -286,53 +457,71 @@ class GeneSignatureRanker:
             po_path = Path(po_file)
             if po_path.exists():
                 print(f"Loading PO: {po_path.name}")
-                self.arabidopsis_po_context = self._parse_arabidopsis_po(po_path)
+                self.arabidopsis_po_context = self._cached(
+                    'po', [po_path], {}, lambda: self._parse_arabidopsis_po(po_path)
+                )
                 print(f"  {len(self.arabidopsis_po_context)} genes with PO context")
             else:
                 print(f"  WARNING: PO file not found: {po_file}")
+        
+        self.arabidopsis_annotation_table = self._annotation_table(
+            self.arabidopsis_annotations, ['symbol', 'annotation_text']
+        )
+        self.arabidopsis_po_table = self._annotation_table(
+            self.arabidopsis_po_context, ['po_terms', 'hits']
+        )
+    
+    def _annotation_table(self, annotations, columns):
+        """Per-locus annotation dicts as a DataFrame indexed by AT locus"""
+        return pd.DataFrame.from_dict(annotations, orient='index', columns=columns)
+    
+    def _ortholog_annotations(self, genes, table):
+        """
+        Look up the best Arabidopsis ortholog of each gene in an annotation table
+        
+        Returns:
+            Rows of `table` indexed by gene, for the genes (in order) whose best
+            ortholog has an entry
+        """
+        best = pd.Series(
+            [self.gene_evidence[g]['best_ortholog'] for g in genes], index=genes, dtype=object
+        ).dropna()
+        best = best[best.isin(table.index)]
+        return table.loc[best.to_numpy()].set_axis(best.index)
     
     def _parse_araport_gff3(self, gff_file):
         """Parse GFF3 - gene features only"""
         annotations = {}
         try:
-            with open(gff_file, 'r') as f:
-                for line in f:
-                    if line.startswith('#'):
-                        continue
-                    parts = line.strip().split('\t')
-                    if len(parts) < 9 or parts[2] != 'gene':
+            if Path(gff_file).stat().st_size == 0:
+                return annotations
+            
+            # One regex pass over the mapped file finds the gene lines
+            with open(gff_file, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as gff:
+                for gene_line in _GFF_GENE_LINE.finditer(gff):
+                    if gene_line.group(1).startswith(b'#'):
                         continue
                     
-                    attrs = parts[8]
-                    locus_match = re.search(r'(AT[1-5MC]G\d{5})', attrs)
+                    attrs = gene_line.group(2).rstrip()
+                    locus_match = _AT_LOCUS.search(attrs)
                     if not locus_match:
                         continue
-                    locus = locus_match.group(1)
+                    locus = locus_match.group(1).decode()
                     
                     # Extract fields
-                    symbol = re.search(r'symbol=([^;]+)', attrs)
-                    curator = re.search(r'curator_summary=([^;]+)', attrs)
-                    full_name = re.search(r'full_name=([^;]+)', attrs)
-                    comp_desc = re.search(r'computational_description=([^;]+)', attrs)
-                    note = re.search(r'Note=([^;]+)', attrs)
+                    symbol, curator, full_name, comp_desc, note = (
+                        pattern.search(attrs) for pattern in _GFF_ATTRIBUTES
+                    )
                     
                     # Priority: curator > full_name > comp_desc > note
-                    annotation_text = ''
-                    if curator:
-                        annotation_text = curator.group(1)
-                    elif full_name:
-                        annotation_text = full_name.group(1)
-                    elif comp_desc:
-                        annotation_text = comp_desc.group(1)
-                    elif note:
-                        annotation_text = note.group(1)
+                    text_match = curator or full_name or comp_desc or note
                     
                     # URL decode
-                    annotation_text = annotation_text.replace('%2C', ',').replace('%3B', ';')
-                    annotation_text = annotation_text.replace('%3D', '=').replace('%20', ' ')
+                    annotation_text = unquote(text_match.group(1).decode()) if text_match else ''
                     
                     annotations[locus] = {
-                        'symbol': symbol.group(1) if symbol else '',
+                        'symbol': symbol.group(1).decode() if symbol else '',
                         'annotation_text': annotation_text
                     }
         except Exception as e:
@@ -345,27 +534,34 @@ class GeneSignatureRanker:
         keywords = ['senescence', 'senescent', 'cell death', 'hypersensitive', 'dying', 'necrosis']
         
         try:
-            df = pd.read_csv(po_file, sep='\t')
-            for _, row in df.iterrows():
-                gene_id = str(row.get('locus_name', row.get('gene_id', '')))
-                locus_match = re.search(r'(AT[1-5MC]G\d{5})', gene_id)
-                if not locus_match:
-                    continue
-                locus = locus_match.group(1)
-                
-                po_term = str(row.get('term_name', row.get('po_term', '')))
-                
-                if locus not in po_context:
-                    po_context[locus] = {'po_terms': [], 'hits': []}
-                
-                po_context[locus]['po_terms'].append(po_term)
+            df = read_tsv(po_file)
+            
+            def column(*names):
+                for name in names:
+                    if name in df.columns:
+                        return df[name].map(str)
+                return pd.Series('', index=df.index)
+            
+            locus = column('locus_name', 'gene_id').str.extract(r'(AT[1-5MC]G\d{5})', expand=False)
+            has_locus = locus.notna()
+            po = pd.DataFrame({
+                'locus': locus[has_locus],
+                'po_term': column('term_name', 'po_term')[has_locus]
+            })
+            
+            # Check keywords
+            keyword_pattern = '|'.join(re.escape(kw) for kw in keywords)
+            is_hit = po['po_term'].str.lower().str.contains(keyword_pattern, regex=True)
+            
+            # Collect terms per locus (a plain pass beats groupby(...).agg(list)
+            # with one group per locus)
+            for locus_id, po_term, hit in zip(po['locus'], po['po_term'], is_hit):
+                if locus_id not in po_context:
+                    po_context[locus_id] = {'po_terms': [], 'hits': []}
                 
-                # Check keywords
-                po_lower = po_term.lower()
-                for kw in keywords:
-                    if kw in po_lower:
-                        po_context[locus]['hits'].append(po_term)
-                        break
+                po_context[locus_id]['po_terms'].append(po_term)
+                if hit:
+                    po_context[locus_id]['hits'].append(po_term)
         except Exception as e:
             print(f"  WARNING: PO parse error: {e}")
         return po_context
@@ -381,6 +577,11 @@ class GeneSignatureRanker:
         protein_fasta = domain_config.get('protein_fasta')
         evalue = domain_config.get('evalue_threshold', 1e-5)
         cpu = domain_config.get('cpu', 4)
+        n_shards = domain_config.get('n_shards')
+        use_hmmsearch = domain_config.get('use_hmmsearch', True)
+        use_pyhmmer = domain_config.get('use_pyhmmer', False)
+        use_cache = domain_config.get('use_cache', True)
+        cache_dir = domain_config.get('cache_dir')
         
         if not pfam_db or not protein_fasta:
             print("  ERROR: pfam_database and protein_fasta required in config")
@@ -397,20 +598,31 @@ class GeneSignatureRanker:
         # Get expected domains per category
         expected_domains_config = domain_config.get('expected_domains', {})
         
-        # Determine category for each gene from GO terms
-        gene_categories = self._categorize_genes(genes)
-        
         # Initialize scanner
         try:
-            scanner = DomainScanner(pfam_db, protein_fasta, cpu=cpu, evalue=evalue)
+            scanner = DomainScanner(pfam_db, protein_fasta, cpu=cpu, evalue=evalue,
+                                    use_hmmsearch=use_hmmsearch, use_pyhmmer=use_pyhmmer,
+                                    use_cache=use_cache, cache_dir=cache_dir,
+                                    n_shards=n_shards)
         except FileNotFoundError as e:
             print(f"  ERROR: {e}")
             return
         
+        # Optionally scan only genes with enough GO evidence; the others score 0
+        scan_genes = genes
+        min_go_score = domain_config.get('min_go_score')
+        if min_go_score is not None:
+            go_scores = self.gene_scores_raw.loc[genes, 'go'].to_numpy()
+            scan_genes = [g for g, score in zip(genes, go_scores) if score >= min_go_score]
+            print(f"  {len(scan_genes)}/{len(genes)} genes with GO score >= {min_go_score}")
+            if not scan_genes:
+                print("  No genes to scan")
+                return
+        
         # Run hmmscan
-        print(f"  Scanning {len(genes)} genes for Pfam domains...")
+        print(f"  Scanning {len(scan_genes)} genes for Pfam domains...")
         output_dir = Path(self.run_info['run_dir']) / 'domain_scan'
-        domtbl_file = scanner.scan_genes(genes, output_dir=str(output_dir))
+        domtbl_file = scanner.scan_genes(scan_genes, output_dir=str(output_dir))
         
         if not domtbl_file or not Path(domtbl_file).exists():
             print("  ERROR: hmmscan failed")
@@ -433,7 +645,7 @@ class GeneSignatureRanker:
                 continue
             
             domains = gene_domains[gene]
-            category = gene_categories.get(gene, 'unknown')
+            category = self.gene_categories.get(gene, 'unknown')
             
             # Get expected domains for this category
             if category == 'PCD':
@@ -452,76 +664,44 @@ class GeneSignatureRanker:
                     expected_domains_config.get('ROS', [])
                 ))
             
-            # Match domains
+            # Match domains as (pfam_id, pfam_name, evalue) records
             for domain in domains:
-                pfam_id = domain['pfam_id']
-                if pfam_id in expected:
-                    pfam_name = domain['pfam_name']
-                    evalue = domain['evalue']
-                    all_matches[gene].append(f"{pfam_id}({pfam_name},E={evalue:.1e})")
+                if domain['pfam_id'] in expected:
+                    all_matches[gene].append((domain['pfam_id'], domain['pfam_name'], domain['evalue']))
         
         # Score genes
+        raw_scores = []
         for gene in genes:
-            matched = list(all_matches[gene])
-            n_unique_domains = len(set(m.split('(')[0] for m in matched))
-            raw_score = n_unique_domains * match_score
-            capped_score = min(raw_score, caps['domain_max'])
-            
-            self.gene_scores_raw[gene]['domain'] = raw_score
-            self.gene_scores_capped[gene]['domain'] = capped_score
-            self.gene_evidence[gene]['matched_domains'] = sorted(matched)
-        
-        raw_scores = [self.gene_scores_raw[g]['domain'] for g in genes]
-        capped_scores = [self.gene_scores_capped[g]['domain'] for g in genes]
-        print(f"  Genes with expected domains: {sum(1 for s in raw_scores if s > 0)}")
-        if raw_scores:
-            print(f"  Raw: max={max(raw_scores):.1f}, mean={np.mean(raw_scores):.1f}")
+            matches = all_matches.get(gene, [])
+            n_unique_domains = len({pfam_id for pfam_id, _, _ in matches})
+            raw_scores.append(n_unique_domains * match_score)
+            # Formatted only when written out (see _format_domains)
+            self.gene_evidence[gene]['matched_domains'] = matches
+        self._set_layer_scores('domain', raw_scores, caps['domain_max'])
+        
+        raw_scores = self.gene_scores_raw['domain']
+        capped_scores = self.gene_scores_capped['domain']
+        print(f"  Genes with expected domains: {(raw_scores > 0).sum()}")
+        if len(raw_scores):
+            print(f"  Raw: max={raw_scores.max():.1f}, mean={np.mean(raw_scores):.1f}")
             print(f"  Capped (max={caps['domain_max']}): mean={np.mean(capped_scores):.1f}")
     
-    def _categorize_genes(self, genes):
-        """Categorize genes based on GO term categories from config"""
-        categories = {}
-        
-        # Get all GO categories from config
-        go_weights = self.config.get('scoring', {}).get('weights', {}).get('go', {})
-        category_terms = {}
-        for category_name, terms_dict in go_weights.items():
-            category_terms[category_name] = set(terms_dict.keys())
-        
-        for gene in genes:
-            go_terms = set(self.gene_evidence[gene].get('go_terms', []))
-            
-            # Find which categories this gene belongs to
-            gene_categories = []
-            for cat_name, cat_terms in category_terms.items():
-                if go_terms & cat_terms:
-                    gene_categories.append(cat_name)
-            
-            # Assign category
-            if len(gene_categories) == 0:
-                categories[gene] = 'unknown'
-            elif len(gene_categories) == 1:
-                categories[gene] = gene_categories[0]
-            else:
-                # Multiple categories: join with '-'
-                categories[gene] = '-'.join(sorted(gene_categories))
-        
-        return categories
-    
     def _score_orthology_evidence(self, genes):
         """Score orthology with cap"""
         ortho_config = self.config['evidence']['orthology_evidence']
         ortho_file = Path(ortho_config['orthology_file'])
         
         print(f"  Loading: {ortho_file.name}")
-        try:
-            ortho_df = pd.read_csv(ortho_file, sep="\t")
-        except:
+        ortho_data = self._cached(
+            'orthology', [ortho_file],
+            {'mapping_rules': ortho_config.get('mapping_rules', {}),
+             'suffix': self.config['id_mapping']['seurat_suffix']},
+            lambda: self._load_orthology(ortho_file, ortho_config)
+        )
+        if ortho_data is None:
             print("  WARNING: Failed to read orthology file")
             return
         
-        ortho_data = self._parse_orthology_file(ortho_df, ortho_config)
-        
         scoring = self.config['scoring']
         caps = scoring['caps']
         weights = scoring['weights']['orthology']
@@ -529,8 +709,10 @@ class GeneSignatureRanker:
         bonus = weights['one_to_one_bonus']
         min_score = weights.get('min_best_score_for_points', 0.5)
         
+        raw_scores = []
         for gene in genes:
             if gene not in ortho_data:
+                raw_scores.append(0)
                 continue
             
             info = ortho_data[gene]
@@ -542,66 +724,83 @@ class GeneSignatureRanker:
                 raw_score = best_score * multiplier
                 if info['classification'] == 'one_to_one':
                     raw_score += bonus
+            raw_scores.append(raw_score)
             
-            capped_score = min(raw_score, caps['orthology_max'])
-            
-            self.gene_scores_raw[gene]['orthology'] = raw_score
-            self.gene_scores_capped[gene]['orthology'] = capped_score
             self.gene_evidence[gene]['arabidopsis_orthologs'] = info['arabidopsis_hits']
             self.gene_evidence[gene]['best_ortholog'] = info['arabidopsis_hits'][0] if info['arabidopsis_hits'] else None
             self.gene_evidence[gene]['best_ortholog_score'] = best_score
             self.gene_evidence[gene]['orthology_class'] = info['classification']
-            
-            # Populate symbol/annotation from GFF3 if available
-            best_orth = info['arabidopsis_hits'][0] if info['arabidopsis_hits'] else None
-            if best_orth and best_orth in self.arabidopsis_annotations:
-                at_info = self.arabidopsis_annotations[best_orth]
-                self.gene_evidence[gene]['at_symbol'] = at_info.get('symbol', '')
-                self.gene_evidence[gene]['at_annotation'] = at_info.get('annotation_text', '')[:200]
-        
-        raw_scores = [self.gene_scores_raw[g]['orthology'] for g in genes]
-        capped_scores = [self.gene_scores_capped[gene]['orthology'] for g in genes]
-        print(f"  Genes with orthologs: {sum(1 for s in raw_scores if s > 0)}")
-        print(f"  Raw: max={max(raw_scores):.1f}, mean={np.mean(raw_scores):.1f}")
+        self._set_layer_scores('orthology', raw_scores, caps['orthology_max'])
+        
+        # Populate symbol/annotation from GFF3 if available
+        at_info = self._ortholog_annotations(genes, self.arabidopsis_annotation_table)
+        self.best_ortholog_annotations = at_info
+        for gene, symbol, annotation in zip(at_info.index, at_info['symbol'], at_info['annotation_text']):
+            self.gene_evidence[gene]['at_symbol'] = symbol
+            self.gene_evidence[gene]['at_annotation'] = annotation[:200]
+        
+        raw_scores = self.gene_scores_raw['orthology']
+        capped_scores = self.gene_scores_capped['orthology']
+        print(f"  Genes with orthologs: {(raw_scores > 0).sum()}")
+        print(f"  Raw: max={raw_scores.max():.1f}, mean={np.mean(raw_scores):.1f}")
         print(f"  Capped (max={caps['orthology_max']}): mean={np.mean(capped_scores):.1f}")
     
+    def _load_orthology(self, ortho_file, config):
+        """Read and parse the orthology file (None if it cannot be read)"""
+        try:
+            ortho_df = read_tsv(ortho_file)
+        except:
+            return None
+        return self._parse_orthology_file(ortho_df, config)
+    
     def _parse_orthology_file(self, ortho_df, config):
         """Parse inParanoid orthology file"""
         mapping_rules = config.get('mapping_rules', {})
         brachy_regex = mapping_rules.get('brachy_id_regex_extract', r"BdiBd21-3\.\dG\d{7}")
         arab_regex = mapping_rules.get('arabidopsis_id_regex_extract', r"AT[1-5MC]G\d{5}")
         
-        brachy_pattern = re.compile(brachy_regex)
-        arab_pattern = re.compile(arab_regex)
+        brachy_pattern = re.compile(f"({brachy_regex})")
+        # One match per Arabidopsis token: the ID, the rest of that token, then
+        # the following whitespace-separated token as its score (if any)
+        hit_pattern = re.compile(rf"(?P<arab_id>{arab_regex})\S*(?:\s+(?P<score>\S+))?")
         suffix = self.config['id_mapping']['seurat_suffix']
         
+        # Brachypodium gene per row; rows without one are skipped
+        brachy_core = ortho_df['OrtoA'].astype(str).str.extract(brachy_pattern, expand=True)[0].dropna()
+        if brachy_core.empty:
+            return {}
+        
+        # All (Arabidopsis ID, score) pairs, indexed by (row, match)
+        orto_b = ortho_df.loc[brachy_core.index, 'OrtoB'].astype(str)
+        pairs = orto_b.str.extractall(hit_pattern)
+        if pairs.empty:
+            return {}
+        
+        hits = pd.DataFrame({
+            'arab_id': pairs['arab_id'],
+            'score': pairs['score'].astype(float).fillna(0.0)
+        })
+        grouped = hits.groupby(level=0, sort=False)['arab_id'].agg(list)
+        
+        # Classify relationships for all rows at once
+        scores = hits['score'].groupby(level=0, sort=False)
+        n_hits = scores.size().to_numpy()
+        best_scores = scores.max().to_numpy()
+        second_scores = (
+            hits['score'].sort_values(ascending=False, kind='stable')
+            .groupby(level=0).nth(1)
+            .droplevel(1)
+            .reindex(grouped.index)
+            .to_numpy()
+        )
+        classifications = self._classify_orthology(n_hits, best_scores, second_scores)
+        
+        # Rows in file order, so a later row for the same gene wins
         ortho_data = {}
-        for _, row in ortho_df.iterrows():
-            brachy_match = brachy_pattern.search(str(row['OrtoA']))
-            if not brachy_match:
-                continue
-            brachy_gene = brachy_match.group() + suffix
-            
-            orto_b = str(row['OrtoB'])
-            arab_hits = []
-            arab_scores = []
-            
-            tokens = orto_b.split()
-            for i, token in enumerate(tokens):
-                arab_match = arab_pattern.search(token)
-                if arab_match:
-                    arab_id = arab_match.group()
-                    score = float(tokens[i+1]) if i+1 < len(tokens) else 0.0
-                    arab_hits.append(arab_id)
-                    arab_scores.append(score)
-            
-            if not arab_hits:
-                continue
-            
-            best_score = max(arab_scores)
-            classification = self._classify_orthology(len(arab_hits), arab_scores)
-            
-            ortho_data[brachy_gene] = {
+        for row_idx, arab_hits, best_score, classification in zip(
+            grouped.index, grouped, best_scores.tolist(), classifications.tolist()
+        ):
+            ortho_data[brachy_core[row_idx] + suffix] = {
                 'arabidopsis_hits': arab_hits,
                 'best_score': best_score,
                 'classification': classification
@@ -609,20 +808,22 @@ class GeneSignatureRanker:
         
         return ortho_data
     
-    def _classify_orthology(self, n_hits, scores):
-        """Classify orthology relationship"""
-        if not scores:
-            return 'none'
-        best_score = max(scores)
-        if best_score < 0.8:
-            return 'low_confidence'
-        if n_hits == 1:
-            return 'one_to_one'
-        if n_hits > 1:
-            sorted_scores = sorted(scores, reverse=True)
-            if sorted_scores[0] - sorted_scores[1] >= 0.2:
-                return 'one_to_one'
-        return 'one_to_many'
+    def _classify_orthology(self, n_hits, best_scores, second_scores):
+        """
+        Classify orthology relationships
+        
+        Vectorized over genes: parallel arrays of hit counts, best and second
+        best scores (NaN for single hits). Returns an array of class labels.
+        """
+        # Select label codes, not strings, so every gene of a class shares
+        # one label object instead of getting its own copy from tolist()
+        labels = np.array(['low_confidence', 'one_to_one', 'one_to_many'], dtype=object)
+        codes = np.select(
+            [best_scores < 0.8, (n_hits == 1) | (best_scores - second_scores >= 0.2)],
+            [0, 1],
+            default=2
+        )
+        return labels[codes]
     
     def _score_arabidopsis_keywords(self, genes):
         """Score TAIR keywords with cap"""
@@ -636,42 +837,85 @@ class GeneSignatureRanker:
             print("  No keywords specified")
             return
         
-        keyword_patterns = [re.compile(re.escape(kw), re.IGNORECASE) for kw in keywords]
+        keyword_hits = self._compile_keywords(keywords)
         
         scoring = self.config['scoring']
         caps = scoring['caps']
         hit_score = scoring['weights'].get('tair_keywords', {}).get('hit', 2)
         
-        for gene in genes:
-            best_orth = self.gene_evidence[gene]['best_ortholog']
-            if not best_orth or best_orth not in self.arabidopsis_annotations:
-                continue
-            
-            at_info = self.arabidopsis_annotations[best_orth]
-            symbol = at_info.get('symbol', '')
-            annotation = at_info.get('annotation_text', '')
-            
+        # Reuse the orthology step's lookup, which also filled at_symbol/at_annotation
+        raw_by_gene = {}
+        at_info = self.best_ortholog_annotations
+        at_info = at_info[at_info.index.isin(genes)]
+        for gene, symbol, annotation in zip(at_info.index, at_info['symbol'], at_info['annotation_text']):
             text = f"{symbol} {annotation}"
-            hits = []
-            for kw, pattern in zip(keywords, keyword_patterns):
-                if pattern.search(text):
-                    hits.append(kw)
+            matched = keyword_hits(text)
+            hits = [kw for i, kw in enumerate(keywords) if i in matched]
             
-            raw_score = len(hits) * hit_score
-            capped_score = min(raw_score, caps['tair_max'])
-            
-            self.gene_scores_raw[gene]['tair'] = raw_score
-            self.gene_scores_capped[gene]['tair'] = capped_score
-            self.gene_evidence[gene]['at_symbol'] = symbol
-            self.gene_evidence[gene]['at_annotation'] = annotation[:200]
+            raw_by_gene[gene] = len(hits) * hit_score
             self.gene_evidence[gene]['tair_keyword_hits'] = hits
+        self._set_layer_scores('tair', [raw_by_gene.get(g, 0) for g in genes], caps['tair_max'])
         
-        raw_scores = [self.gene_scores_raw[g]['tair'] for g in genes]
-        capped_scores = [self.gene_scores_capped[g]['tair'] for g in genes]
-        print(f"  Genes with keyword hits: {sum(1 for s in raw_scores if s > 0)}")
-        print(f"  Raw: max={max(raw_scores):.1f}, mean={np.mean(raw_scores):.1f}")
+        raw_scores = self.gene_scores_raw['tair']
+        capped_scores = self.gene_scores_capped['tair']
+        print(f"  Genes with keyword hits: {(raw_scores > 0).sum()}")
+        print(f"  Raw: max={raw_scores.max():.1f}, mean={np.mean(raw_scores):.1f}")
         print(f"  Capped (max={caps['tair_max']}): mean={np.mean(capped_scores):.1f}")
     
+    def _compile_keywords(self, keywords):
+        """
+        Compile keywords into a case-insensitive multi-keyword matcher
+        
+        With pyahocorasick, ASCII texts are scanned once with an Aho-Corasick
+        automaton of the lowercased keywords, whatever the number of keywords.
+        Otherwise (and for non-ASCII texts, where lowercasing and re.IGNORECASE
+        can disagree) a single alternation is used. It sits in a lookahead so
+        overlapping keywords are all found (e.g. "ROS" inside "necrosis"); only
+        the longest keyword is reported at a given position, so each
+        alternative also lists the shorter keywords that are its prefix.
+        
+        Returns:
+            Function mapping a text to the set of indices of keywords found in it
+        """
+        unique_keywords = sorted(set(keywords), key=len, reverse=True)
+        pattern = re.compile(
+            '(?=' + '|'.join(
+                f'(?P<kw{i}>{re.escape(kw)})' for i, kw in enumerate(unique_keywords)
+            ) + ')',
+            re.IGNORECASE
+        )
+        implied_hits = {
+            f'kw{i}': [
+                j for j, other in enumerate(keywords)
+                if re.match(re.escape(other), kw, re.IGNORECASE)
+            ]
+            for i, kw in enumerate(unique_keywords)
+        }
+        
+        def regex_hits(text):
+            matched = set()
+            for match in pattern.finditer(text):
+                matched.update(implied_hits[match.lastgroup])
+            return matched
+        
+        if not HAS_AHOCORASICK or not all(isinstance(kw, str) and kw and kw.isascii() for kw in keywords):
+            return regex_hits
+        
+        automaton = ahocorasick.Automaton()
+        for kw in {kw.lower() for kw in keywords}:
+            automaton.add_word(kw, [i for i, other in enumerate(keywords) if other.lower() == kw])
+        automaton.make_automaton()
+        
+        def automaton_hits(text):
+            if not text.isascii():
+                return regex_hits(text)
+            matched = set()
+            for _, indices in automaton.iter(text.lower()):
+                matched.update(indices)
+            return matched
+        
+        return automaton_hits
+    
     def _score_po_context(self, genes):
         """Score PO context with cap"""
         if not self.arabidopsis_po_context:
@@ -682,26 +926,18 @@ class GeneSignatureRanker:
         caps = scoring['caps']
         hit_score = scoring['weights'].get('po_keywords', {}).get('hit', 1)
         
-        for gene in genes:
-            best_orth = self.gene_evidence[gene]['best_ortholog']
-            if not best_orth or best_orth not in self.arabidopsis_po_context:
-                continue
-            
-            po_info = self.arabidopsis_po_context[best_orth]
-            po_hits = po_info.get('hits', [])
-            
-            raw_score = len(po_hits) * hit_score
-            capped_score = min(raw_score, caps['po_max'])
-            
-            self.gene_scores_raw[gene]['po'] = raw_score
-            self.gene_scores_capped[gene]['po'] = capped_score
-            self.gene_evidence[gene]['po_terms'] = po_info.get('po_terms', [])[:5]
+        raw_by_gene = {}
+        po_info = self._ortholog_annotations(genes, self.arabidopsis_po_table)
+        for gene, po_terms, po_hits in zip(po_info.index, po_info['po_terms'], po_info['hits']):
+            raw_by_gene[gene] = len(po_hits) * hit_score
+            self.gene_evidence[gene]['po_terms'] = po_terms[:5]
             self.gene_evidence[gene]['po_context_hits'] = po_hits
+        self._set_layer_scores('po', [raw_by_gene.get(g, 0) for g in genes], caps['po_max'])
         
-        raw_scores = [self.gene_scores_raw[g]['po'] for g in genes]
-        capped_scores = [self.gene_scores_capped[g]['po'] for g in genes]
-        print(f"  Genes with PO context: {sum(1 for s in raw_scores if s > 0)}")
-        print(f"  Raw: max={max(raw_scores):.1f}, mean={np.mean(raw_scores):.1f}")
+        raw_scores = self.gene_scores_raw['po']
+        capped_scores = self.gene_scores_capped['po']
+        print(f"  Genes with PO context: {(raw_scores > 0).sum()}")
+        print(f"  Raw: max={raw_scores.max():.1f}, mean={np.mean(raw_scores):.1f}")
         print(f"  Capped (max={caps['po_max']}): mean={np.mean(capped_scores):.1f}")
     
     def _compute_synergy_bonuses(self, genes):
@@ -714,59 +950,62 @@ class GeneSignatureRanker:
             print("  No synergy rules defined")
             return
         
-        for gene in genes:
-            total_synergy = 0
+        # Each distinct condition is evaluated once over all genes; rules are
+        # then ANDs of those masks
+        evidence = [self.gene_evidence[g] for g in genes]
+        condition_masks = {}
+        totals = np.zeros(len(genes), dtype=object)  # keeps int/float bonus types
+        
+        for rule in rules:
+            mask = np.ones(len(genes), dtype=bool)
+            for cond in rule.get('if_all', []):
+                if cond not in condition_masks:
+                    condition_masks[cond] = self._condition_mask(evidence, cond)
+                mask &= condition_masks[cond]
             
-            for rule in rules:
-                conditions = rule.get('if_all', [])
-                bonus = rule.get('bonus', 0)
-                
-                all_met = True
-                for cond in conditions:
-                    if not self._evaluate_condition(gene, cond):
-                        all_met = False
-                        break
-                
-                if all_met:
-                    total_synergy += bonus
-                    self.synergy_bonuses[gene].append(rule.get('name', 'unnamed'))
-            
-            # Cap synergy
-            capped_synergy = min(total_synergy, caps.get('synergy_max', 6))
-            self.gene_scores_raw[gene]['synergy'] = total_synergy
-            self.gene_scores_capped[gene]['synergy'] = capped_synergy
-        
-        raw_scores = [self.gene_scores_raw[g]['synergy'] for g in genes]
-        capped_scores = [self.gene_scores_capped[g]['synergy'] for g in genes]
-        print(f"  Genes with synergy bonuses: {sum(1 for s in raw_scores if s > 0)}")
-        print(f"  Raw: max={max(raw_scores):.1f}, mean={np.mean(raw_scores):.1f}")
+            totals[mask] += rule.get('bonus', 0)
+            name = rule.get('name', 'unnamed')
+            for i in np.flatnonzero(mask):
+                self.synergy_bonuses[genes[i]].append(name)
+        
+        # Cap synergy
+        self._set_layer_scores('synergy', totals.tolist(), caps.get('synergy_max', 6))
+        
+        raw_scores = self.gene_scores_raw['synergy']
+        capped_scores = self.gene_scores_capped['synergy']
+        print(f"  Genes with synergy bonuses: {(raw_scores > 0).sum()}")
+        print(f"  Raw: max={raw_scores.max():.1f}, mean={np.mean(raw_scores):.1f}")
         print(f"  Capped (max={caps.get('synergy_max', 6)}): mean={np.mean(capped_scores):.1f}")
     
-    def _evaluate_condition(self, gene, condition):
-        """Evaluate synergy condition"""
-        evidence = self.gene_evidence[gene]
+    def _condition_mask(self, evidence, condition):
+        """Evaluate synergy condition for all genes (list of evidence dicts)"""
+        n = len(evidence)
         
         if condition == "has_PCD_GO":
-            return 'PCD' in evidence['go_categories']
+            values = ('PCD' in ev['go_categories'] for ev in evidence)
         elif condition == "has_ROS_GO":
-            return 'ROS' in evidence['go_categories']
+            values = ('ROS' in ev['go_categories'] for ev in evidence)
         elif condition == "has_expected_domain":
-            return len(evidence['matched_domains']) > 0
+            values = (len(ev['matched_domains']) > 0 for ev in evidence)
         elif condition.startswith("tair_keyword_hits>="):
             threshold = int(condition.split(">=")[1])
-            return len(evidence['tair_keyword_hits']) >= threshold
+            values = (len(ev['tair_keyword_hits']) >= threshold for ev in evidence)
         elif condition == "has_one_to_one_ortholog":
-            return evidence['orthology_class'] == 'one_to_one'
-        return False
+            values = (ev['orthology_class'] == 'one_to_one' for ev in evidence)
+        else:
+            return np.zeros(n, dtype=bool)
+        return np.fromiter(values, dtype=bool, count=n)
     
     def _compute_total_scores(self, genes):
         """Sum all capped scores"""
-        for gene in genes:
-            total = sum(self.gene_scores_capped[gene][k] for k in ['go', 'domain', 'orthology', 'tair', 'po', 'synergy'])
-            self.gene_scores_capped[gene]['total'] = total
+        capped = self.gene_scores_capped
+        capped['total'] = (
+            capped['go'] + capped['domain'] + capped['orthology']
+            + capped['tair'] + capped['po'] + capped['synergy']
+        )
         
-        scores = [self.gene_scores_capped[g]['total'] for g in genes]
-        print(f"  Total scores: min={min(scores):.1f}, max={max(scores):.1f}")
+        scores = capped['total']
+        print(f"  Total scores: min={scores.min():.1f}, max={scores.max():.1f}")
         print(f"  Mean={np.mean(scores):.1f}, median={np.median(scores):.1f}")
     
     def _write_outputs(self, genes):
@@ -775,45 +1014,42 @@ class GeneSignatureRanker:
         
         # Base list (IDs only)
         base_file = outputs_dir / f"{self.output_prefix}_genes.base.txt"
-        base_file.write_text("\n".join(genes) + "\n")
+        write_lines(base_file, genes)
         print(f"✓ {base_file.name} ({len(genes)} genes)")
         
         # Scored table (complete)
-        rows = []
-        for gene in genes:
-            raw = self.gene_scores_raw[gene]
-            capped = self.gene_scores_capped[gene]
-            evidence = self.gene_evidence[gene]
-            
-            rows.append({
-                'brachy_gene_id': gene,
-                'go_terms': ', '.join(evidence['go_terms']),
-                'go_score_raw': raw['go'],
-                'go_score_capped': capped['go'],
-                'domain_hits': ', '.join(evidence['matched_domains']),
-                'domain_score_raw': raw['domain'],
-                'domain_score_capped': capped['domain'],
-                'best_arabidopsis_id': evidence['best_ortholog'] or '',
-                'best_orth_score': evidence['best_ortholog_score'],
-                'orth_class': evidence['orthology_class'],
-                'orth_score_raw': raw['orthology'],
-                'orth_score_capped': capped['orthology'],
-                'tair_symbol': evidence['at_symbol'],
-                'tair_annotation_text': evidence['at_annotation'],
-                'tair_keyword_hits': ', '.join(evidence['tair_keyword_hits']),
-                'tair_score_raw': raw['tair'],
-                'tair_score_capped': capped['tair'],
-                'po_hits': ', '.join(evidence['po_context_hits']),
-                'po_score_raw': raw['po'],
-                'po_score_capped': capped['po'],
-                'synergy_bonus': capped['synergy'],
-                'synergy_triggers': ', '.join(self.synergy_bonuses[gene]),
-                'total_score': capped['total']
-            })
-        
-        df_scored = pd.DataFrame(rows).sort_values('total_score', ascending=False)
+        raw = self.gene_scores_raw.loc[genes]
+        capped = self.gene_scores_capped.loc[genes]
+        gene_evidence, synergy_bonuses = self.gene_evidence, self.synergy_bonuses
+        evidence = [gene_evidence[gene] for gene in genes]
+        
+        df_scored = pd.DataFrame({
+            'brachy_gene_id': genes,
+            'go_terms': [', '.join(ev['go_terms']) for ev in evidence],
+            'go_score_raw': raw['go'].to_numpy(),
+            'go_score_capped': capped['go'].to_numpy(),
+            'domain_hits': [self._format_domains(ev['matched_domains']) for ev in evidence],
+            'domain_score_raw': raw['domain'].to_numpy(),
+            'domain_score_capped': capped['domain'].to_numpy(),
+            'best_arabidopsis_id': [ev['best_ortholog'] or '' for ev in evidence],
+            'best_orth_score': [ev['best_ortholog_score'] for ev in evidence],
+            'orth_class': [ev['orthology_class'] for ev in evidence],
+            'orth_score_raw': raw['orthology'].to_numpy(),
+            'orth_score_capped': capped['orthology'].to_numpy(),
+            'tair_symbol': [ev['at_symbol'] for ev in evidence],
+            'tair_annotation_text': [ev['at_annotation'] for ev in evidence],
+            'tair_keyword_hits': [', '.join(ev['tair_keyword_hits']) for ev in evidence],
+            'tair_score_raw': raw['tair'].to_numpy(),
+            'tair_score_capped': capped['tair'].to_numpy(),
+            'po_hits': [', '.join(ev['po_context_hits']) for ev in evidence],
+            'po_score_raw': raw['po'].to_numpy(),
+            'po_score_capped': capped['po'].to_numpy(),
+            'synergy_bonus': capped['synergy'].to_numpy(),
+            'synergy_triggers': [', '.join(synergy_bonuses[gene]) for gene in genes],
+            'total_score': capped['total'].to_numpy()
+        }).sort_values('total_score', ascending=False)
         scored_file = outputs_dir / f"{self.output_prefix}_genes.scored.tsv"
-        df_scored.to_csv(scored_file, sep="\t", index=False)
+        write_tsv(df_scored, scored_file)
         print(f"✓ {scored_file.name}")
         
         # Create enriched ALL overview table
@@ -831,6 +1067,12 @@ class GeneSignatureRanker:
         # Generate manifest
         self._generate_manifest(outputs_dir, len(genes), len(high_confidence_genes))
     
+    def _format_domains(self, matches):
+        """Format (pfam_id, pfam_name, evalue) matches as a sorted, comma-separated string"""
+        return ', '.join(sorted(
+            f"{pfam_id}({pfam_name},E={evalue:.1e})" for pfam_id, pfam_name, evalue in matches
+        ))
+    
     def _select_high_confidence(self, genes, df, outputs_dir):
         """Select high-confidence genes and return both list and dataframe"""
         selection = self.config.get('selection', {})
@@ -840,21 +1082,25 @@ class GeneSignatureRanker:
         
         if mode == 'knee':
             threshold = self._find_knee_threshold(scores)
-            selected_df = df[df['total_score'] >= threshold]
-            selected = selected_df['brachy_gene_id'].tolist()
             method_desc = f"knee detection (threshold: {threshold:.1f})"
         else:
             quantile = selection.get('quantile', 0.90)
             threshold = np.quantile(scores, quantile)
-            selected_df = df[df['total_score'] >= threshold]
-            selected = selected_df['brachy_gene_id'].tolist()
             method_desc = f"{quantile*100:.0f}th percentile (threshold: {threshold:.1f})"
         
+        # df is sorted by total_score, descending: the selection is a prefix
+        cut = np.searchsorted(-scores, -threshold, side='right')
+        selected_df = df.iloc[:cut]
+        selected = selected_df['brachy_gene_id'].tolist()
+        
         # Write IDs file
         hc_file = outputs_dir / f"{self.output_prefix}_genes.high_confidence.txt"
-        hc_file.write_text("\n".join(selected) + "\n")
+        write_lines(hc_file, selected)
         print(f"✓ {hc_file.name} ({len(selected)} genes)")
         
+        # Min, median and max from one partition of the scores
+        lo, median, hi = np.quantile(scores, [0.0, 0.5, 1.0])
+        
         # Write summary
         summary_file = outputs_dir / f"{self.output_prefix}_genes.high_confidence.summary.txt"
         with open(summary_file, 'w') as f:
@@ -864,8 +1110,8 @@ class GeneSignatureRanker:
             f.write(f"Total genes: {len(genes)}\n")
             f.write(f"High-confidence: {len(selected)} ({len(selected)/len(genes)*100:.1f}%)\n\n")
             f.write(f"Score stats (all genes):\n")
-            f.write(f"  Min: {scores.min():.1f}, Max: {scores.max():.1f}\n")
-            f.write(f"  Mean: {scores.mean():.1f}, Median: {np.median(scores):.1f}\n")
+            f.write(f"  Min: {lo:.1f}, Max: {hi:.1f}\n")
+            f.write(f"  Mean: {scores.mean():.1f}, Median: {median:.1f}\n")
         
         print(f"✓ {summary_file.name}")
         
@@ -873,23 +1119,28 @@ class GeneSignatureRanker:
     
     def _find_knee_threshold(self, scores):
         """Find knee point in score distribution"""
-        sorted_scores = np.sort(scores)[::-1]
-        if len(sorted_scores) < 10:
+        scores = np.asarray(scores)
+        n = len(scores)
+        if n < 10:
             return np.median(scores)
         
+        # Only the top 30% needs ordering: partition, then sort that band
+        start = int(n * 0.1)
+        end = int(n * 0.3)
+        top = np.sort(np.partition(scores, n - end)[n - end:])[::-1]
+        
         # Normalize
-        norm = (sorted_scores - sorted_scores.min()) / (sorted_scores.max() - sorted_scores.min() + 1e-10)
+        lo, hi = scores.min(), scores.max()
+        norm = (top[start:end] - lo) / (hi - lo + 1e-10)
         
-        # Second derivative
-        grad = np.gradient(norm)
-        grad2 = np.gradient(grad)
+        # Kneedle: rotate about the chord joining the first and last points
+        # of the decreasing curve (norm - (1 - x))
+        chord = 1 - np.arange(start, end) / (n - 1)
         
-        # Find max curvature in top 20-30%
-        start = int(len(sorted_scores) * 0.1)
-        end = int(len(sorted_scores) * 0.3)
-        knee_idx = start + np.argmax(np.abs(grad2[start:end]))
+        # Knee: the point farthest above the chord in the top 10-30%
+        knee_idx = start + np.argmax(norm - chord)
         
-        return sorted_scores[knee_idx]
+        return top[knee_idx]
     
     def _generate_qc_plots(self, genes):
         """Generate QC diagnostic plots"""
@@ -897,46 +1148,51 @@ class GeneSignatureRanker:
             print("  matplotlib not available, skipping plots")
             return
         
+        # Draw on an Agg canvas directly, leaving pyplot's global backend alone
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        
         qc_dir = self.run_info['qc']
         
-        df = pd.DataFrame([
-            {
-                'gene': g,
-                'go_capped': self.gene_scores_capped[g]['go'],
-                'domain_capped': self.gene_scores_capped[g]['domain'],
-                'total': self.gene_scores_capped[g]['total'],
-                'has_domain': len(self.gene_evidence[g]['matched_domains']) > 0,
-                'has_tair_kw': len(self.gene_evidence[g]['tair_keyword_hits']) > 0
-            }
-            for g in genes
-        ])
+        capped = self.gene_scores_capped.loc[genes]
+        df = pd.DataFrame({
+            'gene': genes,
+            'go_capped': capped['go'].to_numpy(),
+            'domain_capped': capped['domain'].to_numpy(),
+            'total': capped['total'].to_numpy(),
+            'has_domain': [len(self.gene_evidence[g]['matched_domains']) > 0 for g in genes],
+            'has_tair_kw': [len(self.gene_evidence[g]['tair_keyword_hits']) > 0 for g in genes]
+        })
+        
+        # One figure is reused for every plot; the tight layout engine fits
+        # the labels at draw time, sparing savefig a bbox_inches='tight' pass
+        fig = Figure(figsize=(8, 6), layout='tight')
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
         
         # Plot 1: GO vs domain
-        plt.figure(figsize=(8, 6))
-        plt.scatter(df['go_capped'], df['domain_capped'], alpha=0.5)
-        plt.xlabel('GO Score (capped)')
-        plt.ylabel('Domain Score (capped)')
-        plt.title('GO vs Domain Evidence')
-        plt.savefig(qc_dir / f"{self.output_prefix}_go_vs_domain.png", dpi=150, bbox_inches='tight')
-        plt.close()
+        ax.scatter(df['go_capped'], df['domain_capped'], alpha=0.5)
+        ax.set_xlabel('GO Score (capped)')
+        ax.set_ylabel('Domain Score (capped)')
+        ax.set_title('GO vs Domain Evidence')
+        fig.savefig(qc_dir / f"{self.output_prefix}_go_vs_domain.png", dpi=150)
+        ax.clear()
         
         # Plot 2: Total vs GO
-        plt.figure(figsize=(8, 6))
-        plt.scatter(df['total'], df['go_capped'], alpha=0.5)
-        plt.xlabel('Total Score')
-        plt.ylabel('GO Score (capped)')
-        plt.title('Total Score vs GO Evidence')
-        plt.savefig(qc_dir / f"{self.output_prefix}_total_vs_go.png", dpi=150, bbox_inches='tight')
-        plt.close()
+        ax.scatter(df['total'], df['go_capped'], alpha=0.5)
+        ax.set_xlabel('Total Score')
+        ax.set_ylabel('GO Score (capped)')
+        ax.set_title('Total Score vs GO Evidence')
+        fig.savefig(qc_dir / f"{self.output_prefix}_total_vs_go.png", dpi=150)
+        ax.clear()
         
         # Plot 3: Score distribution
-        plt.figure(figsize=(10, 6))
-        plt.hist(df['total'], bins=30, edgecolor='black')
-        plt.xlabel('Total Score')
-        plt.ylabel('Gene Count')
-        plt.title('Total Score Distribution')
-        plt.savefig(qc_dir / f"{self.output_prefix}_score_distribution.png", dpi=150, bbox_inches='tight')
-        plt.close()
+        fig.set_size_inches(10, 6)
+        ax.hist(df['total'], bins=30, edgecolor='black')
+        ax.set_xlabel('Total Score')
+        ax.set_ylabel('Gene Count')
+        ax.set_title('Total Score Distribution')
+        fig.savefig(qc_dir / f"{self.output_prefix}_score_distribution.png", dpi=150)
         
         # Text report
         top20 = df.nlargest(20, 'total')
@@ -967,23 +1223,13 @@ class GeneSignatureRanker:
             df_high_conf: DataFrame with high-confidence genes
             outputs_dir: Output directory path
         """
-        light_rows = []
-        
-        # Determine category from GO terms
-        gene_categories = self._categorize_genes(df_high_conf['brachy_gene_id'].tolist())
-        
-        for _, row in df_high_conf.iterrows():
-            gene = row['brachy_gene_id']
-            category = gene_categories.get(gene, 'unknown')
-            
-            light_rows.append({
-                'gene_id': gene,
-                'category': category
-            })
-        
-        df_light = pd.DataFrame(light_rows)
+        genes = df_high_conf['brachy_gene_id'].tolist()
+        df_light = pd.DataFrame({
+            'gene_id': genes,
+            'category': [self.gene_categories.get(gene, 'unknown') for gene in genes]
+        })
         light_file = outputs_dir / f"{self.output_prefix}_genes.HIGH_category.tsv"
-        df_light.to_csv(light_file, sep="\t", index=False)
+        write_tsv(df_light, light_file)
         print(f"✓ {light_file.name} ({len(df_light)} genes)")
         
         # Print category counts
@@ -1001,57 +1247,52 @@ class GeneSignatureRanker:
             outputs_dir: Output directory path
             suffix: "ALL" or "HIGH" for filename
         """
-        overview_rows = []
-        for _, row in df_scored.iterrows():
-            gene = row['brachy_gene_id']
-            evidence = self.gene_evidence[gene]
-            
-            # Create evidence summary
-            evidence_parts = []
-            if evidence['go_categories']:
-                evidence_parts.append("+".join(evidence['go_categories']) + "_GO")
-            if evidence['matched_domains']:
-                evidence_parts.append("Domain")
-            if evidence['tair_keyword_hits']:
-                evidence_parts.append("TAIR_keywords")
-            if evidence['orthology_class'] == 'one_to_one':
-                evidence_parts.append(f"1:1_{evidence['best_ortholog']}")
-            elif evidence['orthology_class'] == 'one_to_many':
-                evidence_parts.append(f"1:many_ortho")
-            
-            evidence_summary = "; ".join(evidence_parts) if evidence_parts else "GO_only"
-            
+        gene_evidence = self.gene_evidence
+        evidence = [gene_evidence[gene] for gene in df_scored['brachy_gene_id']]
+        
+        df_overview = pd.DataFrame({
+            'brachy_gene_id': df_scored['brachy_gene_id'].to_numpy(),
+            'total_score': df_scored['total_score'].to_numpy(),
+            'go_score': df_scored['go_score_capped'].to_numpy(),
+            'domain_score': df_scored['domain_score_capped'].to_numpy(),
+            'orth_score': df_scored['orth_score_capped'].to_numpy(),
+            'tair_score': df_scored['tair_score_capped'].to_numpy(),
+            'po_score': df_scored['po_score_capped'].to_numpy(),
+            'synergy_bonus': df_scored['synergy_bonus'].to_numpy(),
+            'go_terms': df_scored['go_terms'].to_numpy(),
+            'domain_hits': df_scored['domain_hits'].to_numpy(),
+            'best_arabidopsis_id': df_scored['best_arabidopsis_id'].to_numpy(),
+            'best_orth_score': df_scored['best_orth_score'].to_numpy(),
+            'orth_class': df_scored['orth_class'].to_numpy(),
             # Arabidopsis orthologs (all hits, comma-separated)
-            arabidopsis_hits = ", ".join(evidence['arabidopsis_orthologs'])
-            
-            overview_rows.append({
-                'brachy_gene_id': gene,
-                'total_score': row['total_score'],
-                'go_score': row['go_score_capped'],
-                'domain_score': row['domain_score_capped'],
-                'orth_score': row['orth_score_capped'],
-                'tair_score': row['tair_score_capped'],
-                'po_score': row['po_score_capped'],
-                'synergy_bonus': row['synergy_bonus'],
-                'go_terms': row['go_terms'],
-                'domain_hits': row['domain_hits'],
-                'best_arabidopsis_id': row['best_arabidopsis_id'],
-                'best_orth_score': row['best_orth_score'],
-                'orth_class': row['orth_class'],
-                'arabidopsis_hits': arabidopsis_hits,
-                'tair_symbol': row['tair_symbol'],
-                'tair_annotation': row['tair_annotation_text'],
-                'po_stage_hits': row['po_hits'],
-                'evidence_summary': evidence_summary
-            })
-        
-        df_overview = pd.DataFrame(overview_rows)
+            'arabidopsis_hits': [", ".join(ev['arabidopsis_orthologs']) for ev in evidence],
+            'tair_symbol': df_scored['tair_symbol'].to_numpy(),
+            'tair_annotation': df_scored['tair_annotation_text'].to_numpy(),
+            'po_stage_hits': df_scored['po_hits'].to_numpy(),
+            'evidence_summary': [self._evidence_summary(ev) for ev in evidence]
+        })
         overview_file = outputs_dir / f"{self.output_prefix}_genes.{suffix}_overview.tsv"
-        df_overview.to_csv(overview_file, sep="\t", index=False)
+        write_tsv(df_overview, overview_file)
         print(f"✓ {overview_file.name} ({len(df_overview)} genes)")
         
         return overview_file
     
+    def _evidence_summary(self, evidence):
+        """Summarize which evidence layers support a gene"""
+        evidence_parts = []
+        if evidence['go_categories']:
+            evidence_parts.append("+".join(evidence['go_categories']) + "_GO")
+        if evidence['matched_domains']:
+            evidence_parts.append("Domain")
+        if evidence['tair_keyword_hits']:
+            evidence_parts.append("TAIR_keywords")
+        if evidence['orthology_class'] == 'one_to_one':
+            evidence_parts.append(f"1:1_{evidence['best_ortholog']}")
+        elif evidence['orthology_class'] == 'one_to_many':
+            evidence_parts.append(f"1:many_ortho")
+        
+        return "; ".join(evidence_parts) if evidence_parts else "GO_only"
+    
     def _generate_manifest(self, outputs_dir, n_total, n_high_conf):
         """Generate manifest.json with all output files"""
         files_info = [
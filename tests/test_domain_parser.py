@@ -0,0 +1,84 @@
+"""
+Unit tests for PGSB domain table parsing
+"""
+
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from pgsb.domains.parser import parse_domtbl, extract_gene_id, extract_gene_id_series
+
+
+DOMTBL_LINES = [
+    "# target name        accession   tlen query name           accession   qlen   E-value  score  bias   #  of  c-Evalue  i-Evalue  score  bias  from    to  from    to  from    to  acc description of target",
+    "#------------------- ---------- ----- -------------------- ---------- ----- --------- ------ ----- --- --- --------- --------- ------ ----- ----- ----- ----- ----- ----- ----- ---- ---------------------",
+    "Peptidase_C14        PF00656.26   248 BdiBd21-3.2G0277200.1.p -     420   1.2e-50  170.1   0.1   1   1   2.1e-54   3.1e-50  168.7   0.1     2   247   150   410   149   411 0.95 Caspase domain",
+    "NB-ARC               PF00931.26   252 BdiBd21-3.1G0000001.1.p -     900   1e-3   10.0   0.1   1   2   1e-3   2e-2  8.0   0.1     2   247   150   410   149   411 0.95 NB-ARC",
+    "NB-ARC               PF00931.26   252 BdiBd21-3.1G0000001.1.p -     900   1e-3   10.0   0.1   2   2   1e-6   2e-7  18.0   0.1     2   247   150   410   149   411 0.95 NB-ARC domain with a longer description",
+]
+
+
+def _write_domtbl(tmpdir, lines):
+    domtbl = Path(tmpdir) / "test.domtbl"
+    domtbl.write_text("\n".join(lines) + "\n")
+    return domtbl
+
+
+def test_parse_domtbl_filters_on_domain_evalue():
+    """Hits above the domain E-value threshold are dropped"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        domtbl = _write_domtbl(tmpdir, DOMTBL_LINES)
+        
+        gene_domains = parse_domtbl(str(domtbl), evalue_threshold=1e-5)
+        
+        assert list(gene_domains) == ['BdiBd21-3.2G0277200.v1.2', 'BdiBd21-3.1G0000001.v1.2']
+        assert len(gene_domains['BdiBd21-3.1G0000001.v1.2']) == 1
+        
+        hit = gene_domains['BdiBd21-3.2G0277200.v1.2'][0]
+        assert hit == {
+            'pfam_id': 'PF00656',
+            'pfam_accession': 'PF00656.26',
+            'pfam_name': 'Peptidase_C14',
+            'evalue': 3.1e-50,
+            'score': 168.7,
+            'full_evalue': 1.2e-50,
+            'full_score': 170.1
+        }
+
+
+
+def test_parse_domtbl_keeps_hit_at_threshold():
+    """An E-value equal to the threshold passes, with values read exactly as written"""
+    lines = [line.replace("2e-7", "1e-23").replace("1e-6", "3.3e-25") for line in DOMTBL_LINES]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        domtbl = _write_domtbl(tmpdir, lines)
+        
+        gene_domains = parse_domtbl(str(domtbl), evalue_threshold=1e-23)
+        
+        assert [hit['evalue'] for hit in gene_domains['BdiBd21-3.1G0000001.v1.2']] == [1e-23]
+
+def test_parse_domtbl_comments_only():
+    """A table without hits parses to an empty mapping"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        domtbl = _write_domtbl(tmpdir, DOMTBL_LINES[:2])
+        
+        assert parse_domtbl(str(domtbl)) == {}
+
+
+def test_extract_gene_id():
+    """Protein IDs map to versioned gene IDs"""
+    assert extract_gene_id('BdiBd21-3.2G0277200.1.p') == 'BdiBd21-3.2G0277200.v1.2'
+    assert extract_gene_id('BdiBd21-3.2G0277200.v1.2') == 'BdiBd21-3.2G0277200.v1.2'
+
+
+def test_extract_gene_id_series_matches_scalar():
+    """Vectorized gene ID mapping agrees with the scalar version"""
+    protein_ids = pd.Series([
+        'BdiBd21-3.2G0277200.1.p',
+        'BdiBd21-3.2G0277200.2.p',
+        'BdiBd21-3.2G0277200.v1.2'
+    ])
+    
+    expected = [extract_gene_id(p) for p in protein_ids]
+    assert extract_gene_id_series(protein_ids).tolist() == expected
@@ -0,0 +1,350 @@
+"""
+Unit tests for PGSB domain scanner
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from pgsb.domains.scanner import (
+    DomainScanner, _split_fasta, _merge_domtbls, _hmmsearch_to_hmmscan_domtbl
+)
+
+
+FASTA = (
+    ">BdiBd21-3.2G0277200.1.p pacid=1 transcript=BdiBd21-3.2G0277200.1\n"
+    "MKVLAAGIT\n"
+    "LLEQR\n"
+    ">BdiBd21-3.2G0277200.10.p pacid=2\n"
+    "MSTNPKPQR\n"
+    ">BdiBd21-3.1G0000001.1.p\n"
+    "MAAAA\n"
+    ">BdiBd21-3.5G0000009.1\n"
+    "MGGGG"
+)
+
+
+def _make_scanner(tmpdir, fasta_text, **kwargs):
+    pfam_db = Path(tmpdir) / "Pfam-A.hmm"
+    for ext in ['', '.h3m', '.h3i', '.h3f', '.h3p']:
+        Path(f"{pfam_db}{ext}").touch()
+    protein_fasta = Path(tmpdir) / "proteins.fa"
+    protein_fasta.write_text(fasta_text)
+    return DomainScanner(str(pfam_db), str(protein_fasta), **kwargs)
+
+
+def test_extract_proteins_matches_protein_ids():
+    """Whole records are copied for genes whose protein IDs match exactly"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scanner = _make_scanner(tmpdir, FASTA)
+        output_fasta = Path(tmpdir) / "query.fa"
+        
+        n = scanner.extract_proteins(
+            ['BdiBd21-3.2G0277200.v1.2', 'BdiBd21-3.5G0000009.v1.2'], str(output_fasta)
+        )
+        
+        assert n == 2
+        assert output_fasta.read_text() == (
+            ">BdiBd21-3.2G0277200.1.p pacid=1 transcript=BdiBd21-3.2G0277200.1\n"
+            "MKVLAAGIT\n"
+            "LLEQR\n"
+            ">BdiBd21-3.5G0000009.1\n"
+            "MGGGG"
+        )
+
+
+def test_extract_proteins_empty_fasta():
+    """An empty FASTA yields no proteins"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scanner = _make_scanner(tmpdir, "")
+        output_fasta = Path(tmpdir) / "query.fa"
+        
+        assert scanner.extract_proteins(['BdiBd21-3.2G0277200.v1.2'], str(output_fasta)) == 0
+        assert output_fasta.read_text() == ""
+
+
+def test_extract_proteins_trailing_id_field():
+    """A protein ID with one extra trailing field still matches its gene"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scanner = _make_scanner(tmpdir, ">BdiBd21-3.1G0000001.1.p.2 x\nMAAAA\n")
+        output_fasta = Path(tmpdir) / "query.fa"
+        
+        assert scanner.extract_proteins(['BdiBd21-3.1G0000001.v1.2'], str(output_fasta)) == 1
+
+
+def test_split_fasta_keeps_whole_records_in_order():
+    """Shards hold whole records and concatenate back to the input"""
+    data = FASTA.encode()
+    
+    shards = [data[start:end] for start, end in _split_fasta(data, 3)]
+    
+    assert len(shards) == 3
+    assert b''.join(shards) == data
+    assert all(shard.startswith(b'>') for shard in shards)
+    assert len(_split_fasta(data, 10)) == 4  # never more shards than records
+
+
+def test_merge_domtbls_keeps_first_comments():
+    """Shard tables merge in order with one header and one footer"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        shard_tables = []
+        for i in range(2):
+            shard_table = Path(tmpdir) / f"shard_{i}.domtbl"
+            shard_table.write_text(f"# header\nhit_{i}a\nhit_{i}b\n# footer {i}\n")
+            shard_tables.append(str(shard_table))
+        output_domtbl = Path(tmpdir) / "domains.domtbl"
+        
+        _merge_domtbls(shard_tables, str(output_domtbl))
+        
+        assert output_domtbl.read_text() == "# header\nhit_0a\nhit_0b\nhit_1a\nhit_1b\n# footer 0\n"
+
+
+def test_hmmsearch_domtbl_rewritten_to_hmmscan_layout():
+    """hmmsearch rows get hmmscan column order, sorted by query then E-value"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        query_fasta = Path(tmpdir) / "query.fa"
+        query_fasta.write_text(">BdiBd21-3.2G0277200.1.p\nMKV\n>BdiBd21-3.1G0000001.1.p\nMAA\n")
+        domtbl = Path(tmpdir) / "domains.domtbl"
+        domtbl.write_text(
+            "# target name accession tlen query name accession qlen ...\n"
+            "BdiBd21-3.1G0000001.1.p - 900 NB-ARC PF00931.26 252 1e-6 18.0 0.1 1 1 1e-6 2e-7 18.0 0.1 2 247 150 410 149 411 0.95 -\n"
+            "BdiBd21-3.2G0277200.1.p - 420 NB-ARC PF00931.26 252 1e-3 10.0 0.1 1 1 1e-3 1e-3 10.0 0.1 2 247 150 410 149 411 0.95 -\n"
+            "BdiBd21-3.2G0277200.1.p - 420 Peptidase_C14 PF00656.26 248 1.2e-50 170.1 0.1 1 1 2.1e-54 3.1e-50 168.7 0.1 2 247 150 410 149 411 0.95 -\n"
+            "# [ok]\n"
+        )
+        
+        _hmmsearch_to_hmmscan_domtbl(str(domtbl), str(query_fasta))
+        
+        lines = domtbl.read_text().splitlines()
+        assert lines[0].startswith("# target name")
+        assert lines[-1] == "# [ok]"
+        assert [line.split()[:6] for line in lines[1:-1]] == [
+            ['Peptidase_C14', 'PF00656.26', '248', 'BdiBd21-3.2G0277200.1.p', '-', '420'],
+            ['NB-ARC', 'PF00931.26', '252', 'BdiBd21-3.2G0277200.1.p', '-', '420'],
+            ['NB-ARC', 'PF00931.26', '252', 'BdiBd21-3.1G0000001.1.p', '-', '900'],
+        ]
+
+
+def test_pyhmmer_backend_writes_hmmscan_domtbl():
+    """The in-process backend produces a domtbl that parse_domtbl reads"""
+    pyhmmer = pytest.importorskip("pyhmmer")
+    from pgsb.domains.parser import parse_domtbl
+    
+    motif = "MKVLAAGITLLEQRWSTNPKPQRHDYFCEGIMAAKWLRDTPVNEHGQSIFYKCLWRTEDAM"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        alphabet = pyhmmer.easel.Alphabet.amino()
+        seq = pyhmmer.easel.TextSequence(name=b"Motif", sequence=motif).digitize(alphabet)
+        hmm, _, _ = pyhmmer.plan7.Builder(alphabet).build(seq, pyhmmer.plan7.Background(alphabet))
+        hmm.name, hmm.accession = b"Motif", b"PF99999.1"
+        pfam_db = Path(tmpdir) / "Pfam-A.hmm"
+        with open(pfam_db, 'wb') as f:
+            hmm.write(f)
+        protein_fasta = Path(tmpdir) / "proteins.fa"
+        protein_fasta.write_text(
+            f">BdiBd21-3.2G0277200.1.p\nGGGGSGGGGS{motif}GGGGS\n"
+            ">BdiBd21-3.1G0000001.1.p\nPPPPPPPPPPPPPPPPPPPP\n"
+        )
+        scanner = DomainScanner(str(pfam_db), str(protein_fasta), cpu=1, use_pyhmmer=True,
+                                use_cache=False)
+        
+        domtbl = scanner.scan_genes(
+            ['BdiBd21-3.2G0277200.v1.2', 'BdiBd21-3.1G0000001.v1.2'], output_dir=tmpdir
+        )
+        
+        gene_domains = parse_domtbl(domtbl)
+        assert list(gene_domains) == ['BdiBd21-3.2G0277200.v1.2']
+        assert gene_domains['BdiBd21-3.2G0277200.v1.2'][0]['pfam_id'] == 'PF99999'
+
+
+def test_scan_genes_reuses_cached_domtbl():
+    """A second scan of the same proteins, in any order, comes from the cache"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_dir = Path(tmpdir) / "cache"
+        scanner = _make_scanner(tmpdir, FASTA, use_pyhmmer=False, cache_dir=str(cache_dir))
+        genes = ['BdiBd21-3.2G0277200.v1.2', 'BdiBd21-3.1G0000001.v1.2']
+        calls = []
+        
+        def fake_run(query_fasta, output_domtbl, n_shards=None):
+            calls.append(query_fasta)
+            Path(output_domtbl).write_text("# hmmscan\nhit\n")
+            return True
+        
+        scanner.run_hmmscan_parallel = fake_run
+        
+        first = scanner.scan_genes(genes, output_dir=str(Path(tmpdir) / "run1"))
+        second = scanner.scan_genes(genes[::-1], output_dir=str(Path(tmpdir) / "run2"))
+        
+        assert len(calls) == 1
+        assert len(list(cache_dir.glob("*.domtbl"))) == 1
+        assert Path(second).read_text() == Path(first).read_text()
+
+
+def test_hmmsearch_cache_key_ignores_shards():
+    """Every hmmsearch shard uses the Pfam model count as -Z and --domZ, so the
+    cached table does not depend on the shard count"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scanners = [_make_scanner(tmpdir, FASTA, use_hmmsearch=True, use_pyhmmer=False,
+                                  n_shards=n_shards, cache_dir=str(Path(tmpdir) / "cache"))
+                    for n_shards in (1, 3)]
+        Path(scanners[0].pfam_db).write_text("HMMER3/f\nNAME  A\n//\nHMMER3/f\nNAME  B\n//\n")
+        query_fasta = scanners[0].protein_fasta
+        
+        cmd = scanners[1]._hmmscan_cmd(query_fasta, "shard.domtbl", 1)
+        assert cmd[cmd.index('-Z') + 1] == cmd[cmd.index('--domZ') + 1] == '2'
+        assert scanners[0]._cache_key(query_fasta) == scanners[1]._cache_key(query_fasta)
+        
+        hmmscan = _make_scanner(tmpdir, FASTA, use_hmmsearch=False, use_pyhmmer=False)
+        assert hmmscan._cache_key(query_fasta) != scanners[0]._cache_key(query_fasta)
+
+
+def test_protein_index_persisted_and_refreshed():
+    """The FASTA index is saved next to the FASTA and rebuilt when it changes"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scanner = _make_scanner(tmpdir, FASTA)
+        output_fasta = Path(tmpdir) / "query.fa"
+        
+        assert scanner.extract_proteins(['BdiBd21-3.1G0000001.v1.2'], str(output_fasta)) == 1
+        assert Path(f"{scanner.protein_fasta}.pgsbidx").exists()
+        
+        Path(scanner.protein_fasta).write_text(">BdiBd21-3.1G0000001.1.p\nMCCCCCCC\n")
+        scanner = DomainScanner(scanner.pfam_db, scanner.protein_fasta)
+        scanner.extract_proteins(['BdiBd21-3.1G0000001.v1.2'], str(output_fasta))
+        assert output_fasta.read_text() == ">BdiBd21-3.1G0000001.1.p\nMCCCCCCC\n"
+
+
+def test_extract_proteins_custom_id_mapping():
+    """A genome-specific gene -> protein ID mapping replaces the default"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scanner = _make_scanner(
+            tmpdir, ">prot_A\nMAAAA\n>prot_B\nMCCCC\n",
+            gene_to_protein_ids=lambda gene_id: [f"prot_{gene_id}"]
+        )
+        output_fasta = Path(tmpdir) / "query.fa"
+        
+        assert scanner.extract_proteins(['B'], str(output_fasta)) == 1
+        assert output_fasta.read_text() == ">prot_B\nMCCCC\n"
+
+
+def test_parallel_hmmscan_streams_shards_on_stdin(monkeypatch):
+    """Each hmmscan shard reads its records on stdin and the tables merge in order"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bin_dir = Path(tmpdir) / "bin"
+        bin_dir.mkdir()
+        fake_hmmscan = bin_dir / "hmmscan"
+        # Stand-in hmmscan: one domtbl row per query record read from stdin
+        fake_hmmscan.write_text(
+            "#!/bin/sh\n"
+            "while [ $# -gt 0 ]; do [ \"$1\" = --domtblout ] && out=$2; q=$1; shift; done\n"
+            "{ echo '# header'; grep '^>' \"$q\" | cut -c2- | cut -d' ' -f1; } > \"$out\"\n"
+        )
+        fake_hmmscan.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+        scanner = _make_scanner(tmpdir, FASTA, cpu=4, use_hmmsearch=False,
+                                use_pyhmmer=False, use_cache=False)
+        output_domtbl = Path(tmpdir) / "domains.domtbl"
+        
+        assert scanner.run_hmmscan_parallel(scanner.protein_fasta, str(output_domtbl), n_shards=3)
+        assert output_domtbl.read_text().splitlines() == [
+            "# header",
+            "BdiBd21-3.2G0277200.1.p",
+            "BdiBd21-3.2G0277200.10.p",
+            "BdiBd21-3.1G0000001.1.p",
+            "BdiBd21-3.5G0000009.1",
+        ]
+
+
+def test_parallel_hmmscan_stops_started_shards_on_error(monkeypatch):
+    """If a later shard cannot start, shards already running are killed"""
+    import subprocess
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        bin_dir = Path(tmpdir) / "bin"
+        bin_dir.mkdir()
+        fake_hmmscan = bin_dir / "hmmscan"
+        fake_hmmscan.write_text("#!/bin/sh\nsleep 60\n")
+        fake_hmmscan.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+        scanner = _make_scanner(tmpdir, FASTA, cpu=4, use_hmmsearch=False,
+                                use_pyhmmer=False, use_cache=False)
+        
+        started = []
+        real_popen = subprocess.Popen
+        
+        def popen(*args, **kwargs):
+            if started:
+                raise FileNotFoundError("hmmscan")
+            started.append(real_popen(*args, **kwargs))
+            return started[-1]
+        
+        monkeypatch.setattr(subprocess, "Popen", popen)
+        output_domtbl = Path(tmpdir) / "domains.domtbl"
+        
+        with pytest.raises(FileNotFoundError):
+            scanner.run_hmmscan_parallel(scanner.protein_fasta, str(output_domtbl), n_shards=3)
+        
+        assert started[0].poll() is not None
+        assert not list(Path(tmpdir).glob("hmmscan_shards_*"))
+
+
+def test_hmmsearch_keeps_hmmscan_domain_calls_at_threshold():
+    """A domain whose i-Evalue equals the threshold is called by hmmscan and hmmsearch alike"""
+    pyhmmer = pytest.importorskip("pyhmmer")
+    from pgsb.domains.parser import parse_domtbl
+    
+    motif = "MKVLAAGITLLEQRWSTNPKPQRHDYFCEGIMAAKWLRDTPVNEHGQSIFYKCLWRTEDAM"
+    other = "GSHPWTQYVNDEKRCLAIFMGSHPWTQYVNDEKRCLAIFMGSHPWTQYVNDEKRCLAIFM"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        alphabet = pyhmmer.easel.Alphabet.amino()
+        background = pyhmmer.plan7.Background(alphabet)
+        builder = pyhmmer.plan7.Builder(alphabet)
+        hmms = []
+        for i, seq in enumerate([motif, other]):
+            text = pyhmmer.easel.TextSequence(name=f"Motif{i}".encode(), sequence=seq)
+            hmm, _, _ = builder.build(text.digitize(alphabet), background)
+            hmm.name, hmm.accession = f"Motif{i}".encode(), f"PF9999{i}.1".encode()
+            hmms.append(hmm)
+        pfam_db = Path(tmpdir) / "Pfam-A.hmm"
+        with open(pfam_db, 'wb') as f:
+            for hmm in hmms:
+                hmm.write(f)
+        
+        # Many proteins hit the same model, so hmmsearch's domain search space
+        # (proteins per model) is far larger than hmmscan's (models per protein)
+        records = []
+        for i in range(12):
+            mutated = ''.join('W' if j % (i + 3) == 0 else aa for j, aa in enumerate(motif))
+            records.append(f">BdiBd21-3.1G00000{i:02d}.1.p\nGGGGS{mutated}GGGGS\n")
+        protein_fasta = Path(tmpdir) / "proteins.fa"
+        protein_fasta.write_text(''.join(records))
+        genes = [f"BdiBd21-3.1G00000{i:02d}.v1.2" for i in range(12)]
+        
+        with pyhmmer.easel.SequenceFile(str(protein_fasta), digital=True,
+                                        alphabet=alphabet) as seq_file:
+            sequences = seq_file.read_block()
+        
+        def hmmscan_table(evalue):
+            table = Path(tmpdir) / f"hmmscan_{evalue}.domtbl"
+            with open(table, 'wb') as out:
+                for hits in pyhmmer.hmmer.hmmscan(sequences, hmms, E=evalue, domE=evalue,
+                                                  Z=len(hmms)):
+                    hits.write(out, format='domains', header=False)
+            return parse_domtbl(str(table), evalue)
+        
+        # Threshold at the weakest domain hmmscan calls, as printed in its table
+        threshold = max(hit['evalue'] for hits in hmmscan_table(1.0).values() for hit in hits)
+        expected = hmmscan_table(threshold)
+        
+        scanner = DomainScanner(str(pfam_db), str(protein_fasta), cpu=1, evalue=threshold,
+                                use_pyhmmer=True, use_cache=False)
+        domtbl = scanner.scan_genes(genes, output_dir=tmpdir)
+        called = parse_domtbl(domtbl, threshold)
+        
+        def calls(gene_domains):
+            return {(gene, hit['pfam_id']) for gene, hits in gene_domains.items() for hit in hits}
+        
+        at_threshold = {(gene, hit['pfam_id']) for gene, hits in expected.items()
+                        for hit in hits if hit['evalue'] == threshold}
+        assert at_threshold and at_threshold <= calls(called)
+        assert calls(called) == calls(expected)
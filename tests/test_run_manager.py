@@ -13,7 +13,8 @@ from pgsb.io.run_manager import (
     create_run_dir,
     write_config_snapshot,
     update_latest_symlink,
-    create_manifest
+    create_manifest,
+    get_latest_run_dir
 )
 
 
@@ -132,3 +133,54 @@ def test_create_manifest():
         assert 'created' in manifest
         assert len(manifest['files']) == 2
         assert manifest['files'][0]['sha256']  # Has checksum
+
+
+def test_get_latest_run_dir_without_link():
+    """Without a latest link, the newest run directory is found by name"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runs_dir = Path(tmpdir) / "runs"
+        for run_id in ["2026-01-28_143501__TEST__aaaa0000", "2026-02-03_090000__TEST__bbbb1111"]:
+            (runs_dir / run_id).mkdir(parents=True)
+        (runs_dir / "notes.txt").write_text("not a run")
+        
+        latest = get_latest_run_dir(base_dir=tmpdir)
+        
+        assert latest == runs_dir / "2026-02-03_090000__TEST__bbbb1111"
+        assert get_latest_run_dir(base_dir=Path(tmpdir) / "missing") is None
+
+
+def test_update_latest_symlink_replaces_link():
+    """Updating 'latest' repoints it and leaves no temporary link behind"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runs_dir = Path(tmpdir) / "runs"
+        first, second = runs_dir / "run_a", runs_dir / "run_b"
+        first.mkdir(parents=True)
+        second.mkdir()
+        
+        update_latest_symlink(first, base_dir=tmpdir)
+        update_latest_symlink(second, base_dir=tmpdir)
+        
+        assert get_latest_run_dir(base_dir=tmpdir) == second.resolve()
+        assert sorted(p.name for p in Path(tmpdir).iterdir()) in (
+            ['latest', 'runs'], ['latest_path.txt', 'runs']
+        )
+
+
+def test_update_latest_symlink_fallback_drops_old_link(monkeypatch):
+    """When the symlink cannot be made, the text file wins over an old link"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runs_dir = Path(tmpdir) / "runs"
+        first, second = runs_dir / "run_a", runs_dir / "run_b"
+        first.mkdir(parents=True)
+        second.mkdir()
+        update_latest_symlink(first, base_dir=tmpdir)
+        assert (Path(tmpdir) / "latest").is_symlink()
+        
+        def no_symlink(self, target, target_is_directory=False):
+            raise OSError("symlinks not supported")
+        
+        monkeypatch.setattr(Path, "symlink_to", no_symlink)
+        update_latest_symlink(second, base_dir=tmpdir)
+        
+        assert not (Path(tmpdir) / "latest").is_symlink()
+        assert get_latest_run_dir(base_dir=tmpdir) == second.absolute()
@@ -14,6 +14,12 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from rank_gene_signatures import GeneSignatureRanker
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep input/domain caches out of the user's cache so every test parses its inputs"""
+    monkeypatch.setenv("PGSB_CACHE_DIR", str(tmp_path / "cache"))
+
+
 def test_smoke_test_minimal():
     """Run complete pipeline with minimal test data"""
     
@@ -88,15 +94,141 @@ def test_scoring_caps_applied():
     config_path = Path(__file__).parent / "data" / "config_test.yaml"
     
     ranker = GeneSignatureRanker(config_path, run_name="smoke_caps")
+    
+    try:
+        ranker.run(enable_qc=False)
+        
+        # Check that no gene exceeds go_max
+        go_max = ranker.config['scoring']['caps']['go_max']
+        
+        scores = ranker.gene_scores_capped
+        assert (scores['go'] <= go_max).all(), f"GO score {scores['go'].max()} exceeds cap {go_max}"
+        assert (scores['domain'] <= ranker.config['scoring']['caps']['domain_max']).all()
+        assert (scores['orthology'] <= ranker.config['scoring']['caps']['orthology_max']).all()
+    finally:
+        # Clean up, even when an assertion failed
+        shutil.rmtree(ranker.run_info['run_dir'])
+
+
+
+# Expected per-gene results of the orthology, TAIR keyword and PO layers on the
+# test fixture: (orth_class, best_arabidopsis_id, tair_keyword_hits, po_hits,
+# synergy_triggers, total_score)
+LAYER_RESULTS = {
+    'BdiBd21-3.1G0001234.v1.2': ('one_to_one', 'AT1G01010', 'cell death, senescence, hypersensitive',
+                                 'leaf senescence stage, hypersensitive response stage', '1to1+keywords', 21.0),
+    'BdiBd21-3.2G0004567.v1.2': ('one_to_one', 'AT4G04040', 'cell death, ROS', 'Necrosis of petal',
+                                 '1to1+keywords', 18.0),
+    'BdiBd21-3.3G0006789.v1.2': ('one_to_one', 'AT1G01010', 'cell death, senescence, hypersensitive',
+                                 'leaf senescence stage, hypersensitive response stage', '1to1+keywords', 18.0),
+    'BdiBd21-3.1G0002345.v1.2': ('one_to_many', 'AT2G02020', 'peroxidase', '', '', 8.0),
+    'BdiBd21-3.3G0007890.v1.2': ('low_confidence', 'ATMG00010', '', 'dying leaf', '', 7.0),
+    'BdiBd21-3.1G0003456.v1.2': ('low_confidence', 'AT3G03030', 'oxidative', '', '', 6.8),
+    'BdiBd21-3.2G0005678.v1.2': ('none', '', '', '', '', 3.0),
+    'BdiBd21-3.4G0008901.v1.2': ('none', '', '', '', '', 3.0),
+    'BdiBd21-3.4G0009012.v1.2': ('none', '', '', '', '', 3.0),
+}
+
+
+@pytest.mark.parametrize("fast_paths", [True, False])
+def test_evidence_layers(fast_paths, monkeypatch):
+    """Orthology, GFF3 keyword and PO layers score the fixture as expected, with or without pyarrow/pyahocorasick"""
+    import pandas as pd
+    import rank_gene_signatures
+    
+    if not fast_paths:
+        monkeypatch.setattr(rank_gene_signatures, "HAS_PYARROW", False)
+        monkeypatch.setattr(rank_gene_signatures, "HAS_AHOCORASICK", False)
+    
+    config_path = Path(__file__).parent / "data" / "config_test_layers.yaml"
+    
+    ranker = GeneSignatureRanker(config_path, run_name=f"smoke_layers_{fast_paths}")
     ranker.run(enable_qc=False)
     
-    # Check that no gene exceeds go_max
-    go_max = ranker.config['scoring']['caps']['go_max']
+    outputs_dir = ranker.run_info['outputs']
+    df = pd.read_csv(outputs_dir / f"{ranker.output_prefix}_genes.scored.tsv", sep='\t',
+                     keep_default_na=False)
+    columns = ['orth_class', 'best_arabidopsis_id', 'tair_keyword_hits', 'po_hits',
+               'synergy_triggers', 'total_score']
+    
+    assert {row[0]: tuple(row[1:]) for row in df[['brachy_gene_id'] + columns].itertuples(index=False)} \
+        == LAYER_RESULTS
+    
+    # GFF3 attributes: symbol, URL-decoded curator summary, full_name fallback
+    annotations = dict(zip(df['brachy_gene_id'], zip(df['tair_symbol'], df['tair_annotation_text'])))
+    assert annotations['BdiBd21-3.1G0001234.v1.2'] == (
+        'NAC001',
+        'Regulates programmed cell death, induced during leaf senescence; part of the hypersensitive response'
+    )
+    assert annotations['BdiBd21-3.1G0002345.v1.2'] == ('PRX2', 'PEROXIDASE 2')
+    assert annotations['BdiBd21-3.1G0003456.v1.2'] == ('', 'Oxidative stress response protein')
+    
+    # Clean up
+    shutil.rmtree(ranker.run_info['run_dir'])
+
+
+def test_knee_selection():
+    """Knee mode keeps the genes above the cliff of the sorted score curve"""
+    import numpy as np
+    import pandas as pd
+    
+    config_path = Path(__file__).parent / "data" / "config_test_layers.yaml"
+    
+    ranker = GeneSignatureRanker(config_path, run_name="smoke_knee")
+    ranker.config['selection'] = {'mode': 'knee'}
+    
+    try:
+        # 20 high scores, then a cliff down to a long low tail
+        scores = np.concatenate([50 - 0.1 * np.arange(20), 10 - 0.05 * np.arange(80)])
+        np.random.default_rng(0).shuffle(scores)
+        assert ranker._find_knee_threshold(scores) == pytest.approx(48.1)
+        
+        # Fewer than 10 genes: the median score
+        ranker.run(enable_qc=False)
+        
+        outputs_dir = ranker.run_info['outputs']
+        df = pd.read_csv(outputs_dir / f"{ranker.output_prefix}_genes.scored.tsv", sep='\t')
+        selected = (outputs_dir / f"{ranker.output_prefix}_genes.high_confidence.txt").read_text().split()
+        assert selected == df.loc[df['total_score'] >= df['total_score'].median(), 'brachy_gene_id'].tolist()
+        assert len(selected) == 5
+    finally:
+        # Clean up, even when an assertion failed
+        shutil.rmtree(ranker.run_info['run_dir'])
+
+
+def test_input_cache_hit_miss_and_invalidation(tmp_path):
+    """Parsed inputs are reused until the file or parameters change; failed reads are not kept"""
+    
+    config_path = Path(__file__).parent / "data" / "config_test.yaml"
+    
+    ranker = GeneSignatureRanker(config_path, run_name="smoke_cache")
+    input_file = tmp_path / "input.tsv"
+    input_file.write_text("a\n")
+    calls = []
+    
+    def parse():
+        calls.append(1)
+        return {'rows': input_file.read_text().split()}
+    
+    assert ranker._cached('step', [input_file], {'p': 1}, parse) == {'rows': ['a']}
+    assert ranker._cached('step', [input_file], {'p': 1}, parse) == {'rows': ['a']}
+    assert len(calls) == 1  # hit
+    
+    ranker._cached('step', [input_file], {'p': 2}, parse)
+    assert len(calls) == 2  # parameters are part of the key
+    
+    input_file.write_text("a\nb\n")
+    assert ranker._cached('step', [input_file], {'p': 1}, parse) == {'rows': ['a', 'b']}
+    assert len(calls) == 3  # edited input
+    
+    failed = []
+    for _ in range(2):
+        ranker._cached('failing', [input_file], {}, lambda: failed.append(1))
+    assert len(failed) == 2  # None is recomputed, never cached
     
-    for gene, scores in ranker.gene_scores_capped.items():
-        assert scores['go'] <= go_max, f"GO score {scores['go']} exceeds cap {go_max}"
-        assert scores['domain'] <= ranker.config['scoring']['caps']['domain_max']
-        assert scores['orthology'] <= ranker.config['scoring']['caps']['orthology_max']
+    ranker.config['cache'] = {'enabled': False}
+    ranker._cached('step', [input_file], {'p': 1}, parse)
+    assert len(calls) == 4
     
     # Clean up
     shutil.rmtree(ranker.run_info['run_dir'])